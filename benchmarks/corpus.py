@@ -0,0 +1,191 @@
+"""Deterministic generator for synthetic archives and layouts.
+
+The same parameters always produce the same bytes, so benchmark results from different
+commits can be compared.
+
+    python benchmarks/corpus.py OUTPUT_DIR [--seed N] [--widgets N] [--files N] ...
+"""
+import argparse
+from pathlib import Path
+import random
+import sys
+import typing
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jktool import gar  # noqa: E402
+from jktool.layout import WidgetType, WidgetValueType  # noqa: E402
+
+# Size of the data of every pane type, in bytes.
+_PANE_SIZES = {0: 0xC, 1: 0x10, 2: 0x14, 3: 0x28, 4: 0x18, 5: 0x24, 6: 0x2C, 7: 0x38}
+
+_FILE_EXTENSIONS = ("mfl", "bclim", "bcres", "cgfx", "msbt")
+
+# Named file size distributions for archives: (weight, min size, max size)
+SIZE_DISTRIBUTIONS: typing.Dict[str, typing.Sequence[typing.Tuple[int, int, int]]] = {
+    # Mostly small files with a few large textures, like real UI archives.
+    "mixed": ((70, 0x40, 0x1000), (25, 0x1000, 0x10000), (5, 0x10000, 0x80000)),
+    "small": ((1, 0x10, 0x400),),
+    "large": ((1, 0x10000, 0x100000),),
+}
+
+
+class LayoutParams(typing.NamedTuple):
+    seed: int = 1
+    num_widgets: int = 100
+    num_panes: int = 50
+    num_anims: int = 10
+    num_entries: int = 20
+    num_keyframes: int = 8
+
+
+class ArchiveParams(typing.NamedTuple):
+    seed: int = 1
+    num_files: int = 100
+    sizes: str = "mixed"
+    alignment: int = 0x80
+
+
+def _make_color(rng: random.Random) -> dict:
+    return {"v": [rng.randrange(256) / 255.0 for _ in range(4)]}
+
+
+def _make_pane_data(rng: random.Random, type: int) -> dict:
+    data: typing.Dict[str, typing.Any] = {"translate": [rng.uniform(-100, 100) for _ in range(3)]}
+    if type == 1:
+        data["zMultiplier"] = 1.0
+    if type >= 2:
+        data["width"] = float(rng.randrange(1, 400))
+        data["height"] = float(rng.randrange(1, 240))
+    if type == 3:
+        data.update(msgId=rng.randrange(1000), b=0.0, c=0.0, flags=0, numEntries=0, x=[0, 0, 0, 0])
+    if type == 4:
+        data["color"] = _make_color(rng)
+    if type == 5:
+        data["colors"] = [_make_color(rng) for _ in range(4)]
+    if type in (6, 7):
+        data.update(rotate=[0.0, 0.0], scale=[1.0, 1.0], a=0, b=0)
+        data["color"] = _make_color(rng) if type == 6 else [_make_color(rng) for _ in range(4)]
+    return data
+
+
+def _make_keyframe_value(rng: random.Random, value_type: int):
+    if value_type == WidgetValueType.Visible:
+        return rng.randrange(2)
+    if value_type == WidgetValueType.Unk:
+        return rng.randrange(-5, 5)
+    return rng.uniform(-1, 1)
+
+
+def make_layout(params: LayoutParams = LayoutParams()) -> dict:
+    """Generates a layout in the same form as a YAML dump (suitable for lyttool.build_layout)."""
+    rng = random.Random(params.seed)
+    num_panes = max(params.num_panes, 1)
+    panes = []
+    for i in range(num_panes):
+        type = rng.randrange(8)
+        panes.append({"name": f"P{i}", "type": type, "size": _PANE_SIZES[type], "data": _make_pane_data(rng, type)})
+
+    widget_ids: typing.List[str] = []
+
+    def make_widget(type: WidgetType) -> dict:
+        name = f"W{len(widget_ids)}"
+        widget = {
+            "name": name, "id": f"{name}-{len(widget_ids)}", "flags": 0, "type": int(type), "objectIdx": 0,
+            "translate": [rng.uniform(-100, 100), rng.uniform(-100, 100), 0.0],
+            "scale": [1.0, 1.0, 1.0], "rotate": [0.0, 0.0, rng.uniform(0, 360)],
+            "x2C": [0.0, 0.0], "x34": [1.0, 1.0], "x3C": 0.0, "color": _make_color(rng), "widgets": [],
+        }
+        if type == WidgetType.Pane:
+            widget["pane"] = f"P{rng.randrange(num_panes)}"
+        widget_ids.append(widget["id"])
+        return widget
+
+    # Grow the tree breadth-first by attaching new widgets to random containers.
+    root = make_widget(WidgetType.Layout)
+    containers = [root]
+    while len(widget_ids) < params.num_widgets:
+        parent = containers[rng.randrange(len(containers))]
+        type = WidgetType.Pane if rng.random() < 0.6 else rng.choice((WidgetType.Layout, WidgetType.Group))
+        widget = make_widget(type)
+        parent["widgets"].append(widget)
+        if type != WidgetType.Pane:
+            containers.append(widget)
+
+    anims = []
+    for i in range(params.num_anims):
+        start_frame = rng.randrange(10, 120)
+        entries = []
+        for _ in range(params.num_entries):
+            entry_type = rng.randrange(4)
+            value_type = rng.randrange(len(WidgetValueType))
+            if entry_type == 0:
+                frames = sorted(rng.sample(range(start_frame + 1), min(params.num_keyframes, start_frame + 1)))
+                data: list = [{"frame": frame, "flags": rng.randrange(5),
+                               "value": _make_keyframe_value(rng, value_type)} for frame in frames]
+            else:
+                data = [rng.uniform(-1, 1) for _ in range(start_frame + 1)]
+            entries.append({"widget": rng.choice(widget_ids), "valueType": value_type, "flags": entry_type,
+                            "type": entry_type, "maxFrameIdx": start_frame, "data": data})
+        anims.append({"name": f"A{i}", "fps": 30, "startFrame": start_frame, "entries": entries})
+
+    return {"name": "L", "layoutId": 1, "panes": panes, "anims": anims, "mainWidgetsNames": [],
+            "playersNames": ["player"], "rootWidget": root}
+
+
+def make_layout_binary(params: LayoutParams = LayoutParams()) -> bytes:
+    from jktool.lyttool import build_layout
+    return build_layout(make_layout(params))
+
+
+def make_archive_writer(params: ArchiveParams = ArchiveParams()) -> gar.GarWriter:
+    rng = random.Random(params.seed)
+    buckets = SIZE_DISTRIBUTIONS[params.sizes]
+    weights = [weight for weight, _, _ in buckets]
+    writer = gar.GarWriter()
+    writer.set_default_alignment(params.alignment)
+    for i in range(params.num_files):
+        _, min_size, max_size = rng.choices(buckets, weights)[0]
+        size = rng.randrange(min_size, max_size)
+        name = f"dir{i % 8}/file{i}.{rng.choice(_FILE_EXTENSIONS)}"
+        # Random bytes would be slow to generate; a repeated seeded block is enough here.
+        block = rng.getrandbits(8 * 256).to_bytes(256, "little")
+        writer.files[name] = gar.GarWriter.File(name, (block * (size // 256 + 1))[:size])
+    return writer
+
+
+def make_archive(params: ArchiveParams = ArchiveParams()) -> bytes:
+    import io
+    stream = io.BytesIO()
+    make_archive_writer(params).write(stream)
+    return stream.getvalue()
+
+
+def main() -> None:
+    default_layout, default_archive = LayoutParams(), ArchiveParams()
+    parser = argparse.ArgumentParser(description="Write a synthetic layout (.mfl and .mfl.yml) and archive.")
+    parser.add_argument("output", type=Path, help="Output directory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--widgets", type=int, default=default_layout.num_widgets)
+    parser.add_argument("--panes", type=int, default=default_layout.num_panes)
+    parser.add_argument("--anims", type=int, default=default_layout.num_anims)
+    parser.add_argument("--entries", type=int, default=default_layout.num_entries)
+    parser.add_argument("--keyframes", type=int, default=default_layout.num_keyframes)
+    parser.add_argument("--files", type=int, default=default_archive.num_files)
+    parser.add_argument("--sizes", choices=sorted(SIZE_DISTRIBUTIONS), default=default_archive.sizes)
+    args = parser.parse_args()
+
+    import yaml
+    from jktool.lyttool import build_layout
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    layout = make_layout(LayoutParams(args.seed, args.widgets, args.panes, args.anims, args.entries, args.keyframes))
+    (args.output / "synthetic.mfl.yml").write_text(yaml.safe_dump(layout, sort_keys=False))
+    (args.output / "synthetic.mfl").write_bytes(build_layout(layout))
+    (args.output / "synthetic.gar").write_bytes(make_archive(ArchiveParams(args.seed, args.files, args.sizes)))
+    for name in ("synthetic.mfl", "synthetic.mfl.yml", "synthetic.gar"):
+        print(args.output / name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Memory footprint of parsed archive entries.
+
+Compares the compact representation used by gar.Gar with one object per entry
+(a dict of names to Gar.File tuples holding memoryviews), for an archive with many files.
+
+    python benchmarks/memory.py [--files N]
+"""
+import argparse
+import gc
+from pathlib import Path
+import sys
+import tracemalloc
+import typing
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import corpus  # noqa: E402
+from jktool import gar  # noqa: E402
+
+
+def _measure(fn: typing.Callable[[], typing.Any]) -> int:
+    """Returns the number of bytes that are still allocated by the object that fn returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def _make_entry_dict(archive: gar.Gar) -> typing.Dict[str, gar.Gar.File]:
+    # One object per entry, like an index that keeps every entry in a dict.
+    return dict(archive.get_files().items())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50000, help="Number of files in the archive")
+    args = parser.parse_args()
+
+    data = corpus.make_archive(corpus.ArchiveParams(num_files=args.files, sizes="small", alignment=4))
+    archive = gar.Gar(data)
+
+    def open_and_look_up() -> gar.Gar:
+        archive = gar.Gar(data)
+        # Building the lookup index is part of the cost.
+        "missing" in archive.get_files()
+        return archive
+
+    results = (
+        ("compact (gar.Gar)", _measure(lambda: gar.Gar(data))),
+        ("compact + lookup index", _measure(open_and_look_up)),
+        ("dict of entries", _measure(lambda: _make_entry_dict(archive))),
+    )
+    print(f"{args.files} entries, {len(data)} bytes of archive data (not counted)")
+    for name, size in results:
+        print(f"{name:<24} {size / (1 << 20):8.2f} MiB  {size / args.files:8.1f} bytes/entry")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Benchmarks for archive and layout operations on a synthetic corpus.
+
+    python benchmarks/run.py [-o results.json] [--compare baseline.json] [-k FILTER] [--quick]
+
+Results are written as JSON so that they can be compared between commits: run the suite on
+the old commit with -o, then on the new one with --compare. The comparison fails if any
+benchmark got slower than --threshold times its baseline.
+"""
+import argparse
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+import typing
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import corpus  # noqa: E402
+from jktool import gar, gartool, lyttool  # noqa: E402
+from jktool import layout as schemas  # noqa: E402
+
+
+class Benchmark(typing.NamedTuple):
+    name: str
+    # Returns the argument for run. Not timed.
+    setup: typing.Callable[[], typing.Any]
+    run: typing.Callable[[typing.Any], typing.Any]
+    # Whether the setup result can be used for several runs (run does not consume or modify it).
+    reusable: bool = True
+
+
+class Result(typing.NamedTuple):
+    name: str
+    # Seconds per run
+    min: float
+    median: float
+    mean: float
+    stdev: float
+    repeat: int
+    number: int
+
+
+def make_benchmarks(layout_params: corpus.LayoutParams, archive_params: corpus.ArchiveParams,
+                    work_dir: Path) -> typing.List[Benchmark]:
+    archive = corpus.make_archive(archive_params)
+    archive_path = work_dir / "synthetic.gar"
+    archive_path.write_bytes(archive)
+    archive_writer = corpus.make_archive_writer(archive_params)
+    layout = corpus.make_layout_binary(layout_params)
+    layout_yaml = io.StringIO()
+    lyttool.dump_layout_streaming(layout, layout_yaml)
+    layout_text = layout_yaml.getvalue()
+    extract_count = [0]
+
+    def setup_extract() -> Path:
+        # Every run extracts a fresh copy so that it really writes all files.
+        extract_count[0] += 1
+        path = work_dir / f"extract{extract_count[0]}" / "synthetic.gar"
+        path.parent.mkdir()
+        path.write_bytes(archive)
+        return path
+
+    def create_archive(files: typing.Dict[str, gar.GarWriter.File]) -> None:
+        writer = gar.GarWriter()
+        writer.set_default_alignment(archive_params.alignment)
+        writer.files.update(files)
+        writer.write(io.BytesIO())
+
+    def list_archive(path: Path) -> None:
+        for name, file in gar.open_gar(path).get_files().items():
+            len(file.data)
+
+    return [
+        Benchmark("gar.open", lambda: archive, gar.Gar),
+        Benchmark("gar.list", lambda: archive_path, list_archive),
+        Benchmark("gar.extract", setup_extract, lambda path: list(gartool.extract_archive(path)), reusable=False),
+        Benchmark("gar.create", lambda: archive_writer.files, create_archive),
+        Benchmark("gar.rewrite", lambda: archive_writer, lambda writer: writer.write(io.BytesIO())),
+        Benchmark("layout.parse", lambda: layout, schemas.Layout.parse),
+        Benchmark("layout.index", lambda: layout, lyttool.layoutindex.LayoutIndex),
+        Benchmark("layout.dump", lambda: layout, lambda data: lyttool.dump_layout_streaming(data, io.StringIO())),
+        Benchmark("layout.load", lambda: layout_text,
+                  lambda text: lyttool.yaml.load(text, Loader=lyttool.yaml.CSafeLoader)),
+        Benchmark("layout.build", lambda: lyttool.yaml.load(layout_text, Loader=lyttool.yaml.CSafeLoader),
+                  lyttool.build_layout, reusable=False),
+    ]
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int, min_time: float) -> Result:
+    timer = timeit.default_timer
+    number = 1
+    if benchmark.reusable:
+        # Like timeit's autorange: run enough times per repeat for the timer to be accurate.
+        arg = benchmark.setup()
+        while True:
+            start = timer()
+            for _ in range(number):
+                benchmark.run(arg)
+            if timer() - start >= min_time:
+                break
+            number *= 2
+
+    times = []
+    for _ in range(repeat):
+        if benchmark.reusable:
+            start = timer()
+            for _ in range(number):
+                benchmark.run(arg)
+            times.append((timer() - start) / number)
+        else:
+            arg = benchmark.setup()
+            start = timer()
+            benchmark.run(arg)
+            times.append(timer() - start)
+
+    return Result(benchmark.name, min(times), statistics.median(times), statistics.mean(times),
+                  statistics.stdev(times) if len(times) > 1 else 0.0, repeat, number)
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: typing.Sequence[Result], baseline: dict, threshold: float) -> typing.List[str]:
+    """Prints how results compare to a baseline and returns the benchmarks that regressed."""
+    baseline_results = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':<16} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for result in results:
+        old = baseline_results.get(result.name)
+        if old is None:
+            print(f"{result.name:<16} {'-':>12} {result.min * 1000:>10.3f}ms")
+            continue
+        ratio = result.min / old["min"] if old["min"] else float("inf")
+        marker = " !" if ratio > threshold else ""
+        print(f"{result.name:<16} {old['min'] * 1000:>10.3f}ms {result.min * 1000:>10.3f}ms {ratio:>7.2f}x{marker}")
+        if ratio > threshold:
+            regressions.append(result.name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", type=Path, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Compare with results from a previous run")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown ratio above which a benchmark counts as a regression (default: 1.2)")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repeats (the best one is compared)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum duration of a repeat, in seconds")
+    parser.add_argument("--quick", action="store_true", help="Use a small corpus (for checking that everything runs)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.quick:
+        layout_params = corpus.LayoutParams(args.seed, num_widgets=20, num_panes=10, num_anims=2, num_entries=5)
+        archive_params = corpus.ArchiveParams(args.seed, num_files=10, sizes="small")
+        args.repeat, args.min_time = min(args.repeat, 2), 0.01
+    else:
+        layout_params = corpus.LayoutParams(args.seed, num_widgets=500, num_panes=200, num_anims=50,
+                                            num_entries=40, num_keyframes=10)
+        archive_params = corpus.ArchiveParams(args.seed, num_files=500)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for benchmark in make_benchmarks(layout_params, archive_params, Path(work_dir)):
+            if args.filter not in benchmark.name:
+                continue
+            result = run_benchmark(benchmark, args.repeat, args.min_time)
+            results.append(result)
+            print(f"{result.name:<16} min {result.min * 1000:10.3f}ms  median {result.median * 1000:10.3f}ms"
+                  f"  (x{result.number})", flush=True)
+
+    report = {
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "layout_params": layout_params._asdict(),
+        "archive_params": archive_params._asdict(),
+        "results": [r._asdict() for r in results],
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("layout_params") != report["layout_params"] or \
+                baseline.get("archive_params") != report["archive_params"]:
+            sys.stderr.write("warning: the baseline was run with a different corpus\n")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.stderr.write(f"regressions: {', '.join(regressions)}\n")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Startup time benchmark and guard for the command line tools.
+
+Runs each entry point under `python -X importtime` and reports the total import time.
+Fails if an entry point imports a module that it is supposed to load lazily (or if it is
+slower than --budget-ms), so that heavy imports do not creep back into the startup path.
+
+    python benchmarks/startup.py [--runs N] [--budget-ms MS] [--json]
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import typing
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class Target(typing.NamedTuple):
+    name: str
+    code: str
+    # Modules that must not be imported.
+    forbidden: typing.Tuple[str, ...]
+
+
+_HEAVY = ("construct", "yaml")
+
+TARGETS = (
+    Target("import jktool", "import jktool", _HEAVY + ("jktool.gar",)),
+    Target("import jktool.gartool", "import jktool.gartool", _HEAVY),
+    Target("import jktool.lyttool", "import jktool.lyttool", _HEAVY),
+    Target("import jktool.server", "import jktool.server", _HEAVY + ("jktool.gar", "jktool.lyttool")),
+    Target("glyttool --help",
+           "import sys; sys.argv = ['glyttool', '--help']; from jktool.lyttool import main; main()", _HEAVY),
+    Target("gar --help",
+           "import sys; sys.argv = ['gar', '--help']; from jktool.gartool import main; main()", _HEAVY),
+)
+
+
+class Result(typing.NamedTuple):
+    name: str
+    # Best total import time over all runs minus that of the interpreter itself, in milliseconds.
+    import_ms: float
+    forbidden_imports: typing.List[str]
+
+
+def _run_once(code: str) -> typing.Tuple[float, typing.Set[str]]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (str(REPO_ROOT), os.environ.get("PYTHONPATH")))))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr}")
+    total_us = 0
+    modules: typing.Set[str] = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Top-level imports are not indented.
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def _best_of(code: str, runs: int) -> typing.Tuple[float, typing.Set[str]]:
+    best = float("inf")
+    modules: typing.Set[str] = set()
+    for _ in range(runs):
+        ms, modules = _run_once(code)
+        best = min(best, ms)
+    return best, modules
+
+
+def run_target(target: Target, runs: int, baseline_ms: float = 0.0) -> Result:
+    best, modules = _best_of(target.code, runs)
+    forbidden = sorted(m for m in modules if any(m == f or m.startswith(f + ".") for f in target.forbidden))
+    return Result(target.name, max(best - baseline_ms, 0.0), forbidden)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per target (the best one is kept)")
+    parser.add_argument("--budget-ms", type=float, help="Fail if a target takes longer than this to import")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    baseline_ms, _ = _best_of("pass", args.runs)
+    results = [run_target(target, args.runs, baseline_ms) for target in TARGETS]
+    failures = []
+    for result in results:
+        if result.forbidden_imports:
+            failures.append(f"{result.name}: imports {', '.join(result.forbidden_imports)}")
+        if args.budget_ms is not None and result.import_ms > args.budget_ms:
+            failures.append(f"{result.name}: {result.import_ms:.1f} ms > {args.budget_ms:.1f} ms")
+
+    if args.json:
+        print(json.dumps([r._asdict() for r in results], indent=2))
+    else:
+        for result in results:
+            print(f"{result.name:<24} {result.import_ms:8.1f} ms")
+    for failure in failures:
+        sys.stderr.write(f"FAIL: {failure}\n")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,11 @@
-from . import gar
+import importlib
+
+# Submodules that are accessible as attributes of the package. They are only imported when
+# first used so that importing a single tool does not pull in everything else.
+_SUBMODULES = ("gar",)
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,118 @@
+from array import array
+from collections import OrderedDict
+import io
+from pathlib import Path
+import struct
+import sys
+import typing
+
+from jktool.animeval import BakedAnim, evaluate_layout_anim
+from jktool.layout import WidgetValueType
+from jktool.util import content_hash
+
+_MAGIC = b'JKBA'
+_VERSION = 1
+_FileHeader = struct.Struct("<4sIiiiI")
+_TrackHeader = struct.Struct("<HBx")
+
+
+def _write_baked_anim(stream: typing.BinaryIO, anim: BakedAnim) -> None:
+    frames = anim.frames
+    num_tracks = sum(len(x) for x in anim.tracks.values())
+    stream.write(_FileHeader.pack(_MAGIC, _VERSION, frames.start, frames.stop, frames.step, num_tracks))
+    for widget_idx, widget_tracks in anim.tracks.items():
+        for value_type, track in widget_tracks.items():
+            stream.write(_TrackHeader.pack(widget_idx, value_type))
+            if sys.byteorder != 'little':
+                track = array('f', track)
+                track.byteswap()
+            stream.write(track.tobytes())
+
+
+def _read_baked_anim(data: bytes, name: str) -> typing.Optional[BakedAnim]:
+    """Returns None if the data was written by another version or is truncated or corrupt."""
+    try:
+        return _parse_baked_anim(data, name)
+    except (struct.error, ValueError):
+        return None
+
+
+def _parse_baked_anim(data: bytes, name: str) -> typing.Optional[BakedAnim]:
+    magic, version, start, stop, step, num_tracks = _FileHeader.unpack_from(data, 0)
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    frames = range(start, stop, step)
+    track_size = 4 * len(frames)
+    if len(data) != _FileHeader.size + num_tracks * (_TrackHeader.size + track_size):
+        return None
+    tracks: typing.Dict[int, typing.Dict[WidgetValueType, array]] = dict()
+    offset = _FileHeader.size
+    for _ in range(num_tracks):
+        widget_idx, value_type = _TrackHeader.unpack_from(data, offset)
+        offset += _TrackHeader.size
+        track = array('f')
+        track.frombytes(data[offset:offset + track_size])
+        if sys.byteorder != 'little':
+            track.byteswap()
+        offset += track_size
+        tracks.setdefault(widget_idx, dict())[WidgetValueType(value_type)] = track
+    return BakedAnim(name=name, frames=frames, tracks=tracks)
+
+
+class BakedAnimCache:
+    """Cache of baked anim tracks, keyed by layout content hash and anim name.
+
+    Baked anims are kept in an in-memory LRU and, if cache_dir is set, also stored on disk
+    so that they survive across runs. Only full frame ranges are cached.
+    """
+
+    def __init__(self, max_entries: int = 64, cache_dir: typing.Optional[Path] = None) -> None:
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: 'OrderedDict[typing.Tuple[str, str], BakedAnim]' = OrderedDict()
+
+    def get(self, data: typing.Union[bytes, memoryview], name: str) -> BakedAnim:
+        """Returns the baked tracks for an anim, evaluating the anim only if they are not cached."""
+        key = (content_hash(data), name)
+        anim = self._entries.get(key)
+        if anim is not None:
+            self._entries.move_to_end(key)
+            return anim
+
+        anim = self._load(key)
+        if anim is None:
+            anim = evaluate_layout_anim(data, name)
+            self._store(key, anim)
+        self._add(key, anim)
+        return anim
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _add(self, key: typing.Tuple[str, str], anim: BakedAnim) -> None:
+        self._entries[key] = anim
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_path(self, key: typing.Tuple[str, str]) -> typing.Optional[Path]:
+        if not self.cache_dir:
+            return None
+        layout_hash, name = key
+        return self.cache_dir / layout_hash / f"{content_hash(name.encode())}.bin"
+
+    def _load(self, key: typing.Tuple[str, str]) -> typing.Optional[BakedAnim]:
+        path = self._get_path(key)
+        if not path or not path.is_file():
+            return None
+        return _read_baked_anim(path.read_bytes(), key[1])
+
+    def _store(self, key: typing.Tuple[str, str], anim: BakedAnim) -> None:
+        path = self._get_path(key)
+        if not path:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        buf = io.BytesIO()
+        _write_baked_anim(buf, anim)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(buf.getvalue())
+        tmp_path.replace(path)
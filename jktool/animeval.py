@@ -0,0 +1,130 @@
+from array import array
+import bisect
+from dataclasses import dataclass
+import operator
+import typing
+
+from jktool.layout import AnimEntryType, AnimKeyframeType, WidgetValueType
+from jktool.layoutindex import get_layout_index
+
+Track = array  # one 'f' value per sampled frame
+
+
+@dataclass
+class BakedAnim:
+    name: str
+    frames: range
+    # widget index -> value type -> sampled values
+    tracks: typing.Dict[int, typing.Dict[WidgetValueType, Track]]
+
+
+def get_base_value(widget, value_type: WidgetValueType) -> float:
+    """Returns the value a widget has when no anim is applied to it.
+
+    This is what Add entries are applied on top of. Value types that do not map to a known
+    widget field default to 0.0 (or 1.0 for Visible).
+    """
+    if value_type <= WidgetValueType.TranslateZ:
+        return widget.translate[value_type - WidgetValueType.TranslateX]
+    if value_type <= WidgetValueType.ScaleZ:
+        return widget.scale[value_type - WidgetValueType.ScaleX]
+    if value_type <= WidgetValueType.RotateZ:
+        return widget.rotate[value_type - WidgetValueType.RotateX]
+    if value_type == WidgetValueType.Visible:
+        return 1.0
+    if value_type in (WidgetValueType.Field2C_X, WidgetValueType.Field2C_Y):
+        return widget.x2C[value_type - WidgetValueType.Field2C_X]
+    if value_type == WidgetValueType.Field34:
+        return widget.x34[0]
+    if WidgetValueType.ColorR <= value_type <= WidgetValueType.ColorA:
+        return widget.color.v[value_type - WidgetValueType.ColorR]
+    return 0.0
+
+
+def _constant(value: float, n: int) -> Track:
+    return array('f', [value]) * n
+
+
+def _sample_segment(k0, k1, frames: range) -> Track:
+    if k0.type == AnimKeyframeType.SetToZero:
+        return _constant(0.0, len(frames))
+    if k0.type != AnimKeyframeType.Lerp or k1.frame == k0.frame:
+        return _constant(k0.value, len(frames))
+    v0 = k0.value
+    f0 = k0.frame
+    slope = (k1.value - v0) / (k1.frame - f0)
+    return array('f', [v0 + (f - f0) * slope for f in frames])
+
+
+def _sample_keyframes(keyframes, frames: range) -> Track:
+    """Samples Interpolate keyframes one segment at a time.
+
+    Lerp keyframes are linearly interpolated towards the next keyframe, SetToZero ones hold 0.0
+    and every other type is treated as a step. Frames outside of the keyframe range are clamped.
+    """
+    n = len(frames)
+    if not keyframes:
+        return _constant(0.0, n)
+    keyframes = sorted(keyframes, key=operator.attrgetter("frame"))
+
+    out = array('f')
+    first = keyframes[0]
+    out += _constant(first.value, bisect.bisect_left(frames, first.frame))
+    for k0, k1 in zip(keyframes, keyframes[1:]):
+        lo = bisect.bisect_left(frames, k0.frame)
+        hi = bisect.bisect_left(frames, k1.frame)
+        if lo != hi:
+            out += _sample_segment(k0, k1, frames[lo:hi])
+    last = keyframes[-1]
+    out += _constant(0.0 if last.type == AnimKeyframeType.SetToZero else last.value, n - len(out))
+    return out
+
+
+def _sample_values(values, frames: range) -> Track:
+    """Samples a per-frame value list (Set/Add entries), clamping frames to the list bounds."""
+    n = len(values)
+    if frames.step == 1 and frames.start >= 0 and frames.stop <= n:
+        return array('f', values[frames.start:frames.stop])
+    return array('f', [values[min(max(f, 0), n - 1)] for f in frames])
+
+
+def evaluate_anim(widgets, anim, frames: typing.Optional[range] = None, name: str = "") -> BakedAnim:
+    """Samples every entry of an anim over a whole frame range at once.
+
+    widgets is the flat widget list of the layout (used for the base values of Add entries)
+    and frames defaults to every frame of the anim. Entries are applied in order:
+    Interpolate and Set entries replace the current track of their widget value, whereas
+    Add entries are added to it (AddPositive additionally clamps the result to >= 0).
+    """
+    if frames is None:
+        frames = range(anim.startFrame + 1)
+    if frames.step <= 0:
+        raise ValueError("frames must be an increasing range")
+
+    tracks: typing.Dict[int, typing.Dict[WidgetValueType, Track]] = dict()
+    for entry in anim.entries:
+        value_type = WidgetValueType(int(entry.valueType))
+        widget_tracks = tracks.setdefault(entry.widgetIdx, dict())
+
+        if entry.type == AnimEntryType.Interpolate:
+            track = _sample_keyframes(entry.data, frames)
+        elif entry.type == AnimEntryType.Set:
+            track = _sample_values(entry.data, frames)
+        else:
+            track = widget_tracks.get(value_type)
+            if track is None:
+                track = _constant(get_base_value(widgets[entry.widgetIdx], value_type), len(frames))
+            track = array('f', map(operator.add, track, _sample_values(entry.data, frames)))
+            if entry.type == AnimEntryType.AddPositive:
+                track = array('f', [x if x > 0.0 else 0.0 for x in track])
+
+        widget_tracks[value_type] = track
+
+    return BakedAnim(name=name, frames=frames, tracks=tracks)
+
+
+def evaluate_layout_anim(data: typing.Union[bytes, memoryview], name: str,
+                         frames: typing.Optional[range] = None) -> BakedAnim:
+    """Samples a single anim of a binary layout without decoding the other anims."""
+    index = get_layout_index(data)
+    return evaluate_anim(index.parse_widgets(data), index.parse_anim(data, name), frames, name)
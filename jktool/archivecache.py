@@ -0,0 +1,88 @@
+"""Cache of open archives, for tools that read from the same archives repeatedly.
+
+Archives are memory-mapped and parsed once, then reused for as long as the file keeps
+the same mtime and size. The cache is thread-safe, so worker threads can share it.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import typing
+
+from jktool import gar
+
+
+class _Entry(typing.NamedTuple):
+    mtime_ns: int
+    size: int
+    archive: gar.Gar
+
+
+class ArchiveCache:
+    """LRU cache of open archives.
+
+    The least recently used archives are dropped when more than max_archives are open or when
+    their total size exceeds max_bytes. The most recently used archive is always kept, even if
+    it is larger than max_bytes. Dropped archives are unmapped once nothing refers to their data.
+    """
+
+    def __init__(self, max_archives: int = 16, max_bytes: int = 1 << 30) -> None:
+        self.max_archives = max_archives
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: typing.OrderedDict[Path, _Entry] = OrderedDict()
+        self._mapped_bytes = 0
+        self._lock = threading.Lock()
+
+    def open(self, path: typing.Union[str, Path]) -> gar.Gar:
+        """Returns the archive at path, opening it if it is not cached or if it was modified."""
+        path = Path(path).resolve()
+        st = path.stat()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and (entry.mtime_ns, entry.size) == (st.st_mtime_ns, st.st_size):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry.archive
+            if entry is not None:
+                self._remove(path)
+
+            self.misses += 1
+            entry = _Entry(st.st_mtime_ns, st.st_size, gar.open_gar(path))
+            self._entries[path] = entry
+            self._mapped_bytes += entry.size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_archives or
+                                              self._mapped_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+            return entry.archive
+
+    def discard(self, path: typing.Union[str, Path]) -> None:
+        """Forgets an archive (if it is cached)."""
+        with self._lock:
+            path = Path(path).resolve()
+            if path in self._entries:
+                self._remove(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._mapped_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def mapped_bytes(self) -> int:
+        """Total size of the cached archives."""
+        return self._mapped_bytes
+
+    def _remove(self, path: Path) -> None:
+        self._mapped_bytes -= self._entries.pop(path).size
+
+
+default_cache = ArchiveCache()
+
+
+def open_archive(path: typing.Union[str, Path]) -> gar.Gar:
+    """Opens an archive through the shared cache."""
+    return default_cache.open(path)
@@ -0,0 +1,130 @@
+"""Persistent index of the files in every archive of a directory tree.
+
+The index is a SQLite database that records where each file is stored (archive, offset and
+size) along with a content hash. Refreshing it only rescans archives whose mtime or size
+changed, and scanning is done in parallel.
+"""
+from pathlib import Path
+import typing
+
+from jktool import fileindex, gar
+from jktool.fileindex import RefreshStats
+from jktool.util import content_hash
+
+DEFAULT_INDEX_NAME = ".gar-index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    basename TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_name ON files(name);
+CREATE INDEX IF NOT EXISTS files_basename ON files(basename);
+CREATE INDEX IF NOT EXISTS files_hash ON files(hash);
+CREATE INDEX IF NOT EXISTS files_archive ON files(archive_id);
+"""
+
+
+class IndexedFile(typing.NamedTuple):
+    # Archive path, relative to the directory that contains the index
+    archive: str
+    name: str
+    offset: int
+    size: int
+    hash: str
+
+
+def _scan_archive(root: Path, rel_path: str) -> fileindex.ScanResult:
+    """Returns (name, offset, size, hash) for every file in an archive."""
+    path = root / rel_path
+    try:
+        st = path.stat()
+        archive = gar.open_gar(path)
+        entries = [(name, file.offset, len(file.data), content_hash(file.data))
+                   for name, file in archive.get_files().items()]
+        return fileindex.ScanResult(rel_path, st.st_mtime_ns, st.st_size, entries, [])
+    except Exception as e:
+        return fileindex.scan_failed(rel_path, e)
+
+
+class AssetIndex:
+    """Index of the files in all archives (*.gar) under the directory that contains the database."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self.root = db_path.resolve().parent
+        self._db = fileindex.open_db(db_path, _SCHEMA, "archives")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "AssetIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def refresh(self, num_workers: typing.Optional[int] = None) -> RefreshStats:
+        """Rescans archives that were added or modified since the last refresh and forgets deleted ones."""
+        return fileindex.refresh(self._db, "archives", self.root, (".gar",), _scan_archive, self._add_archive,
+                                 num_workers)
+
+    def _add_archive(self, archive_id: int, entries: typing.List[typing.Tuple[str, int, int, str]]) -> None:
+        self._db.executemany(
+            "INSERT INTO files (archive_id, name, basename, offset, size, hash) VALUES (?, ?, ?, ?, ?, ?)",
+            ((archive_id, name, name.rsplit("/", 1)[-1], offset, size, hash)
+             for name, offset, size, hash in entries))
+
+    def find(self, pattern: str) -> typing.List[IndexedFile]:
+        """Finds files by name.
+
+        A pattern without a slash matches file names in any directory. Glob wildcards
+        (*, ? and [...]) are supported.
+        """
+        column = "name" if "/" in pattern else "basename"
+        op = "GLOB" if fileindex.has_wildcards(pattern) else "="
+        return self._query(f"WHERE files.{column} {op} ?", (pattern,))
+
+    def find_by_hash(self, hash: str) -> typing.List[IndexedFile]:
+        """Finds all copies of a file with the specified content hash."""
+        return self._query("WHERE files.hash = ?", (hash,))
+
+    def get_hashes(self, archive_path: Path) -> typing.Optional[typing.Dict[str, str]]:
+        """Returns the content hash of every file in an archive.
+
+        Returns None if the archive is not in the index or was modified since the last refresh.
+        """
+        try:
+            rel_path = archive_path.resolve().relative_to(self.root).as_posix()
+            st = archive_path.stat()
+        except (OSError, ValueError):
+            return None
+        row = self._db.execute("SELECT id, mtime_ns, size FROM archives WHERE path = ?", (rel_path,)).fetchone()
+        if row is None or row[1:] != (st.st_mtime_ns, st.st_size):
+            return None
+        return dict(self._db.execute("SELECT name, hash FROM files WHERE archive_id = ?", (row[0],)))
+
+    def get_archive_path(self, file: IndexedFile) -> Path:
+        return self.root / file.archive
+
+    def _query(self, where: str, params: tuple) -> typing.List[IndexedFile]:
+        rows = self._db.execute(
+            "SELECT archives.path, files.name, files.offset, files.size, files.hash "
+            "FROM files JOIN archives ON archives.id = files.archive_id "
+            f"{where} ORDER BY archives.path, files.name", params)
+        return [IndexedFile(*row) for row in rows]
+
+
+def find_index(start: Path) -> typing.Optional[Path]:
+    """Looks for an index in start and its parent directories."""
+    return fileindex.find_index(start, DEFAULT_INDEX_NAME)
@@ -0,0 +1,85 @@
+import functools
+import json
+import os
+from pathlib import Path
+import typing
+
+from jktool.util import content_hash
+
+
+@functools.lru_cache(maxsize=None)
+def get_tool_version() -> str:
+    """Returns a string that changes whenever the tool could build different binaries."""
+    try:
+        from importlib.metadata import version
+        package_version = version("jktool")
+    except Exception:
+        package_version = "unknown"
+    # Every module of the package is hashed: listing the ones on the build path by hand
+    # is easy to get wrong (e.g. build_layout depends on widgettree).
+    package_dir = Path(__file__).parent
+    sources = b"".join(path.name.encode() + b"\x00" + path.read_bytes()
+                       for path in sorted(package_dir.glob("*.py")))
+    return f"{package_version}+{content_hash(sources)}"
+
+
+class BuildCache:
+    """On-disk cache of built binaries, keyed by source content hash, file type and tool version.
+
+    The cache also remembers which output file was last written from which key, so that
+    unchanged outputs do not even need to be rewritten.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+        self._manifest_path = cache_dir / "manifest.json"
+        self._loaded_manifest: typing.Optional[typing.Dict[str, list]] = None
+
+    @property
+    def _manifest(self) -> typing.Dict[str, list]:
+        # Only loaded when needed: workers that just build binaries never use it.
+        if self._loaded_manifest is None:
+            self._loaded_manifest = dict()
+            if self._manifest_path.is_file():
+                try:
+                    self._loaded_manifest = json.loads(self._manifest_path.read_text())
+                except ValueError:
+                    pass
+        return self._loaded_manifest
+
+    def get_key(self, source: bytes, type: str) -> str:
+        return content_hash(b"\x00".join((get_tool_version().encode(), type.encode(), source)))
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        path = self._get_path(key)
+        return path.read_bytes() if path.is_file() else None
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def is_output_up_to_date(self, dest: Path, key: str) -> bool:
+        entry = self._manifest.get(str(dest.resolve()))
+        if not entry or entry[0] != key:
+            return False
+        try:
+            st = dest.stat()
+        except FileNotFoundError:
+            return False
+        return [st.st_mtime_ns, st.st_size] == entry[1:]
+
+    def record_output(self, dest: Path, key: str) -> None:
+        st = dest.stat()
+        self._manifest[str(dest.resolve())] = [key, st.st_mtime_ns, st.st_size]
+
+    def save(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._manifest_path.with_name(f"manifest.json.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._manifest))
+        tmp_path.replace(self._manifest_path)
+
+    def _get_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
@@ -0,0 +1,141 @@
+"""Shared parts of the SQLite indexes of a directory tree (assetindex, layoutquery).
+
+An index covers a directory tree, by default the directory that contains it. It has a table
+with one row per indexed file (id, path relative to that directory, mtime_ns and size) that the
+other tables reference
+with ON DELETE CASCADE, so that forgetting a file also forgets everything extracted from it.
+"""
+import concurrent.futures
+import os
+from pathlib import Path
+import sqlite3
+import typing
+
+
+class RefreshStats(typing.NamedTuple):
+    scanned: int
+    unchanged: int
+    removed: int
+    # (path, error message) for files (or archive members) that could not be read
+    errors: typing.List[typing.Tuple[str, str]]
+
+
+class ScanResult(typing.NamedTuple):
+    path: str
+    # 0 if the file could not be read at all
+    mtime_ns: int
+    size: int
+    # Whatever the scan function extracted from the file
+    data: typing.Any
+    errors: typing.List[typing.Tuple[str, str]]
+
+
+def scan_failed(rel_path: str, e: Exception) -> ScanResult:
+    return ScanResult(rel_path, 0, 0, None, [(rel_path, format_error(e))])
+
+
+def format_error(e: Exception) -> str:
+    return f"{e.__class__.__name__}: {e}"
+
+
+def has_wildcards(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[")
+
+
+def open_db(db_path: Path, schema: str, files_table: str, schema_version: int = 0) -> sqlite3.Connection:
+    """Opens (or creates) an index database.
+
+    If the database was written with another schema version, all files are forgotten
+    so that the next refresh rescans them.
+    """
+    db = sqlite3.connect(str(db_path))
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(schema)
+    if db.execute("PRAGMA user_version").fetchone()[0] != schema_version:
+        with db:
+            db.execute(f"DELETE FROM {files_table}")
+            db.execute(f"PRAGMA user_version = {schema_version:d}")
+    return db
+
+
+def get_root(db: sqlite3.Connection, db_path: Path, root: typing.Optional[Path] = None) -> Path:
+    """Returns the directory covered by an index.
+
+    That is root if specified (it is then stored in the database), else the stored directory,
+    else the directory that contains the database. A stored directory is relative to the latter,
+    so that an index can be moved along with the tree it covers.
+    """
+    db_dir = db_path.resolve().parent
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS root (path TEXT NOT NULL)")
+        if root is not None:
+            db.execute("DELETE FROM root")
+            db.execute("INSERT INTO root (path) VALUES (?)", (os.path.relpath(root.resolve(), db_dir),))
+            return root.resolve()
+    row = db.execute("SELECT path FROM root").fetchone()
+    return (db_dir / row[0]).resolve() if row else db_dir
+
+
+def refresh(db: sqlite3.Connection, files_table: str, root: Path, suffixes: typing.Collection[str],
+            scan: typing.Callable[[Path, str], ScanResult], add: typing.Callable[[int, typing.Any], None],
+            num_workers: typing.Optional[int] = None) -> RefreshStats:
+    """Rescans files that were added or modified since the last refresh and forgets deleted ones.
+
+    scan is called with the root and the path of a file relative to it, in worker processes
+    (so it must be a module-level function). add is called with the id of the new row and
+    the data of every successful scan result; it should insert whatever was extracted.
+    """
+    known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size
+             in db.execute(f"SELECT id, path, mtime_ns, size FROM {files_table}")}
+
+    to_scan: typing.List[str] = []
+    present: typing.Set[str] = set()
+    for path in sorted(root.rglob("*")):
+        if path.suffix not in suffixes or not path.is_file():
+            continue
+        rel_path = path.relative_to(root).as_posix()
+        present.add(rel_path)
+        st = path.stat()
+        entry = known.get(rel_path)
+        if entry is None or entry[1:] != (st.st_mtime_ns, st.st_size):
+            to_scan.append(rel_path)
+
+    removed = [path for path in known if path not in present]
+    errors: typing.List[typing.Tuple[str, str]] = []
+    num_failed = 0
+    with db:
+        for path in removed:
+            db.execute(f"DELETE FROM {files_table} WHERE id = ?", (known[path][0],))
+
+        if num_workers == 1 or len(to_scan) <= 1:
+            results: typing.Iterable[ScanResult] = (scan(root, path) for path in to_scan)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+            results = executor.map(scan, [root] * len(to_scan), to_scan, chunksize=4)
+        try:
+            for result in results:
+                if result.path in known:
+                    db.execute(f"DELETE FROM {files_table} WHERE id = ?", (known[result.path][0],))
+                errors.extend(result.errors)
+                if not result.mtime_ns:
+                    num_failed += 1
+                    continue
+                file_id = db.execute(f"INSERT INTO {files_table} (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                     (result.path, result.mtime_ns, result.size)).lastrowid
+                add(file_id, result.data)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    return RefreshStats(len(to_scan) - num_failed, len(present) - len(to_scan), len(removed), errors)
+
+
+def find_index(start: Path, name: str) -> typing.Optional[Path]:
+    """Looks for an index file in start and its parent directories."""
+    start = start.resolve()
+    for directory in (start, *start.parents):
+        path = directory / name
+        if path.is_file():
+            return path
+    return None
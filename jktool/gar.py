@@ -1,18 +1,32 @@
 # Copyright 2018 leoetlino <leo@leolam.fr>
 # Licensed under GPLv2+
+from array import array
+import collections.abc
 import io
+import itertools
 import math
+import mmap
 from operator import itemgetter
 from pathlib import Path
 import struct
+import sys
 import typing
 from dataclasses import dataclass
-from collections import defaultdict
 
 _NUL_CHAR = b'\x00'
 _Header = struct.Struct("<4sIHHIII8s")
 _FileEntry = struct.Struct('<III')
 
+def _read_u32_array(data: memoryview, offset: int, count: int) -> array:
+    values = array('I')
+    raw = data[offset:offset + 4 * count]
+    if len(raw) != 4 * count:
+        raise ValueError("Truncated file table")
+    values.frombytes(raw)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
 class Gar:
     class File(typing.NamedTuple):
         offset: int
@@ -20,53 +34,217 @@ class Gar:
 
     def __init__(self, data: typing.Union[bytes, memoryview]) -> None:
         self._data = memoryview(data)
-        self._files: typing.Dict[str, Gar.File] = dict()
 
         magic, size, num_types, num_files, types_offset, info_offset, data_offsets_offset, creator = _Header.unpack_from(self._data, 0)
         if magic != b'GAR\x02':
             raise ValueError("Invalid magic: %s (expected 'GAR\\x02')" % magic)
 
-        offset = info_offset
-        for i in range(num_files):
-            file_size, file_stem_offset, file_name_offset = _FileEntry.unpack_from(self._data, offset)
-            name = self._read_string(file_name_offset)
-            file_offset: int = struct.unpack_from('<I', self._data, data_offsets_offset + 4 * i)[0]
-            self._files[name] = self.File(offset=file_offset,
-                                          data=self._data[file_offset:file_offset+file_size])
-            offset += _FileEntry.size
+        # Entries are stored as parallel arrays rather than as one object per file, since
+        # indexes over many archives can hold a lot of entries.
+        # File info entries are (size, stem offset, name offset).
+        file_info = _read_u32_array(self._data, info_offset, 3 * num_files)
+        self._sizes = file_info[0::3]
+        self._offsets = _read_u32_array(self._data, data_offsets_offset, num_files)
+        names = [self._read_string_bytes(offset) for offset in file_info[2::3]]
+        if len(set(names)) != len(names):
+            # Like a dict of names to files: a name is listed where it first appears,
+            # but refers to its last entry.
+            last = {name: i for i, name in enumerate(names)}
+            order = [last[name] for name in dict.fromkeys(names)]
+            self._sizes = array('I', (self._sizes[i] for i in order))
+            self._offsets = array('I', (self._offsets[i] for i in order))
+            names = [names[i] for i in order]
+        self._name_blob = b''.join(names)
+        # Name i is _name_blob[_name_offsets[i]:_name_offsets[i + 1]]
+        self._name_offsets = array('I', [0])
+        self._name_offsets.extend(itertools.accumulate(len(name) for name in names))
+        # Entry indices sorted by name, for lookups (built when first needed)
+        self._sorted_indices: typing.Optional[array] = None
 
-    def get_files(self) -> dict:
-        return self._files
+    def get_files(self) -> typing.Mapping[str, 'Gar.File']:
+        """Returns a read-only mapping of names to files. File data is only sliced on access."""
+        return _FileMapping(self)
 
     def get_file_offsets(self) -> typing.List[typing.Tuple[str, int]]:
-        offsets: list = []
-        for name, file in self._files.items():
-            offsets.append((name, file.offset))
-        return sorted(offsets)
+        return sorted(zip(map(self._get_name, range(len(self._offsets))), self._offsets))
 
     def guess_default_alignment(self) -> int:
-        if len(self._files) <= 2:
+        if len(self._offsets) <= 2:
             return 4
-        gcd = next(iter(self._files.values())).offset
-        for node in self._files.values():
-            gcd = math.gcd(gcd, node.offset)
+        gcd = self._offsets[0]
+        for offset in self._offsets:
+            gcd = math.gcd(gcd, offset)
         return gcd
 
+    def _get_name_bytes(self, idx: int) -> bytes:
+        return self._name_blob[self._name_offsets[idx]:self._name_offsets[idx + 1]]
+
+    def _get_name(self, idx: int) -> str:
+        return self._get_name_bytes(idx).decode('utf-8')
+
+    def _get_file(self, idx: int) -> 'Gar.File':
+        offset = self._offsets[idx]
+        return self.File(offset=offset, data=self._data[offset:offset + self._sizes[idx]])
+
+    def _find(self, name: str) -> int:
+        """Returns the index of the file with the specified name, or -1."""
+        if self._sorted_indices is None:
+            self._sorted_indices = array('I', sorted(range(len(self._offsets)), key=self._get_name_bytes))
+        key = name.encode('utf-8')
+        lo, hi = 0, len(self._sorted_indices)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_name_bytes(self._sorted_indices[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._sorted_indices) and self._get_name_bytes(self._sorted_indices[lo]) == key:
+            return self._sorted_indices[lo]
+        return -1
+
     def _read_u32(self, offset: int) -> int:
         return struct.unpack_from('>I', self._data, offset)[0]
-    def _read_string(self, offset: int) -> str:
+    def _read_string_bytes(self, offset: int) -> bytes:
         end = self._data.obj.find(_NUL_CHAR, offset) # type: ignore
-        return bytes(self._data[offset:end]).decode('utf-8')
+        if end < 0:
+            raise ValueError("Truncated name at 0x%x" % offset)
+        return bytes(self._data[offset:end])
+
+class _FileMapping(typing.Mapping[str, Gar.File]):
+    def __init__(self, archive: Gar) -> None:
+        self._archive = archive
+
+    def __getitem__(self, name: str) -> Gar.File:
+        idx = self._archive._find(name)
+        if idx < 0:
+            raise KeyError(name)
+        return self._archive._get_file(idx)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self._archive._find(name) >= 0
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return map(self._archive._get_name, range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self._archive._offsets)
+
+    def values(self) -> typing.ValuesView[Gar.File]:
+        return _FileValuesView(self)
+
+    def items(self) -> typing.ItemsView[str, Gar.File]:
+        return _FileItemsView(self)
+
+class _FileValuesView(collections.abc.ValuesView):
+    # Iterate by index instead of looking up every name.
+    def __iter__(self) -> typing.Iterator[Gar.File]:
+        archive: Gar = self._mapping._archive
+        return map(archive._get_file, range(len(self._mapping)))
+
+class _FileItemsView(collections.abc.ItemsView):
+    def __iter__(self) -> typing.Iterator[typing.Tuple[str, Gar.File]]:
+        archive: Gar = self._mapping._archive
+        data, blob, name_offsets, File = archive._data, archive._name_blob, archive._name_offsets, Gar.File
+        name_start = 0
+        for offset, size, name_end in zip(archive._offsets, archive._sizes, itertools.islice(name_offsets, 1, None)):
+            yield blob[name_start:name_end].decode('utf-8'), File(offset, data[offset:offset + size])
+            name_start = name_end
+
+def open_gar(path: typing.Union[str, Path]) -> Gar:
+    """Opens an archive by mapping it into memory, so that file data is only read on access."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            data = f.read()
+    return Gar(data)
 
 def _align_up(n: int, alignment: int) -> int:
     return (n + alignment - 1) & -alignment
 
-def _write(stream: typing.BinaryIO, data: bytes, offset: int) -> int:
-    current_pos = stream.tell()
-    stream.seek(offset)
-    stream.write(data)
-    stream.seek(current_pos)
-    return len(data)
+_U32 = struct.Struct('<I')
+_TypeEntry = struct.Struct('<IIII')
+_UNSET = 0xffffffff
+
+class GarWriterPlan:
+    """Layout of everything in an archive that only depends on the names and types of its files.
+
+    Names and stems are encoded and the type and name tables are laid out once, so that writing
+    the same set of files again (e.g. with updated data) only fills in sizes and data offsets.
+    """
+
+    def __init__(self, files: typing.Sequence[typing.Tuple[str, str]]) -> None:
+        """files is a sequence of (name, type) in the order in which they are stored."""
+        self.files = tuple(files)
+        file_types: typing.Dict[str, typing.List[int]] = {"unknown": []}
+        for i, (name, type) in enumerate(self.files):
+            file_types.setdefault(type, []).append(i)
+        self.num_types = len(file_types)
+
+        meta = bytearray(_Header.size)
+
+        # Types
+        self.types_offset = len(meta)
+        meta += bytes(_TypeEntry.size * len(file_types))
+        for i, (type_name, indices) in enumerate(file_types.items()):
+            indices_offset = _UNSET
+            if indices:
+                indices_offset = len(meta)
+                meta += struct.pack(f'<{len(indices)}I', *indices)
+            _TypeEntry.pack_into(meta, self.types_offset + i * _TypeEntry.size,
+                                 len(indices), indices_offset, len(meta), _UNSET)
+            meta += type_name.encode() + _NUL_CHAR
+            meta += bytes(_align_up(len(meta), 4) - len(meta))
+
+        # File info (sizes are filled in when writing)
+        self.file_info_offset = len(meta)
+        meta += bytes(_FileEntry.size * len(self.files))
+        for i, (name, type) in enumerate(self.files):
+            name_offset = len(meta)
+            meta += name.encode() + _NUL_CHAR
+            stem_offset = len(meta)
+            meta += name.split(".")[0].encode() + _NUL_CHAR
+            meta += bytes(_align_up(len(meta), 4) - len(meta))
+            _FileEntry.pack_into(meta, self.file_info_offset + i * _FileEntry.size, 0, stem_offset, name_offset)
+
+        # Data offsets (filled in when writing)
+        self.data_offsets_offset = len(meta)
+        meta += bytes(4 * len(self.files))
+        self._meta = bytes(meta)
+        self._data_offsets = struct.Struct(f'<{len(self.files)}I')
+
+    def write(self, stream: typing.BinaryIO, data: typing.Sequence[typing.Union[memoryview, bytes]],
+              alignments: typing.Sequence[int]) -> int:
+        """Writes an archive with the specified file data and alignments (in plan order).
+
+        Returns the least common multiple of the alignments.
+        """
+        meta = bytearray(self._meta)
+        offsets: typing.List[int] = []
+        offset = len(meta)
+        max_alignment = 1
+        for i, (file_data, alignment) in enumerate(zip(data, alignments)):
+            max_alignment = (max_alignment * alignment) // math.gcd(max_alignment, alignment)
+            offset = _align_up(offset, alignment)
+            offsets.append(offset)
+            offset += len(file_data)
+            _U32.pack_into(meta, self.file_info_offset + i * _FileEntry.size, len(file_data))
+        self._data_offsets.pack_into(meta, self.data_offsets_offset, *offsets)
+        _Header.pack_into(meta, 0, b"GAR\x02", offset, self.num_types, len(self.files),
+                          self.types_offset, self.file_info_offset, self.data_offsets_offset, b"jenkins")
+
+        stream.write(meta)
+        pos = len(meta)
+        for file_data, file_offset in zip(data, offsets):
+            # Like seeking past the end, padding only materialises once something is written after it.
+            if not len(file_data):
+                continue
+            if file_offset != pos:
+                stream.write(bytes(file_offset - pos))
+            stream.write(file_data)
+            pos = file_offset + len(file_data)
+        return max_alignment
 
 class GarWriter:
     @dataclass
@@ -82,11 +260,21 @@ class GarWriter:
         name: str
         data: typing.Union[memoryview, bytes]
         type: str
-        _idx: int = -1
 
     def __init__(self) -> None:
         self.files: typing.Dict[str, GarWriter.File] = dict()
         self._default_alignment = 4
+        # Reused as long as the names and types of the files do not change.
+        self._plan: typing.Optional[GarWriterPlan] = None
+
+    @classmethod
+    def from_gar(cls, archive: Gar) -> 'GarWriter':
+        """Creates a writer that contains all files of an existing archive, in the same order."""
+        writer = cls()
+        writer.set_default_alignment(archive.guess_default_alignment())
+        for name, file in archive.get_files().items():
+            writer.files[name] = cls.File(name, file.data)
+        return writer
 
     def set_default_alignment(self, alignment: int) -> None:
         self._default_alignment = alignment
@@ -108,79 +296,9 @@ class GarWriter:
         return offsets
 
     def write(self, stream: typing.BinaryIO) -> int:
-        file_types: typing.DefaultDict[str, typing.List[GarWriter.File]] = defaultdict(list)
-        file_types["unknown"] = []
-        for i, file in enumerate(self.files.values()):
-            file_types[file.type].append(file)
-            file._idx = i
-
-        # GAR header
-        stream.seek(_Header.size)
-
-        # Types
-        types_offset = stream.tell()
-        for type_name, files in file_types.items():
-            stream.write(self._u32(len(files)))
-            # File indices offset
-            stream.write(self._u32(0xffffffff))
-            # Name offset
-            stream.write(self._u32(0xffffffff))
-            # ???
-            stream.write(self._u32(0xffffffff))
-
-        for i, (type_name, files) in enumerate(file_types.items()):
-            entry_offset = types_offset + i * 0x10
-
-            # File indices
-            if files:
-                _write(stream, self._u32(stream.tell()), entry_offset + 4)
-                for file in files:
-                    stream.write(self._u32(file._idx))
-
-            # Type name
-            _write(stream, self._u32(stream.tell()), entry_offset + 8)
-            stream.write(type_name.encode())
-            stream.write(_NUL_CHAR)
-            stream.seek(_align_up(stream.tell(), 4))
-
-        # File info
-        file_info_offset = stream.tell()
-        for file in self.files.values():
-            stream.write(self._u32(len(file.data)))
-            # File stem offset
-            stream.write(self._u32(0xffffffff))
-            # File name offset
-            stream.write(self._u32(0xffffffff))
-
-        for i, file in enumerate(self.files.values()):
-            entry_offset = file_info_offset + i * 0xC
-            _write(stream, self._u32(stream.tell()), entry_offset + 8)
-            stream.write(file.name.encode())
-            stream.write(_NUL_CHAR)
-            _write(stream, self._u32(stream.tell()), entry_offset + 4)
-            stream.write(file.name.split(".")[0].encode())
-            stream.write(_NUL_CHAR)
-            stream.seek(_align_up(stream.tell(), 4))
-
-        # Data offsets
-        data_offsets_offset = stream.tell()
-        stream.seek(stream.tell() + 4 * len(self.files))
-
-        # File data
-        max_alignment = 1
-        for i, file in enumerate(self.files.values()):
-            alignment = self._get_alignment_for_file(file)
-            max_alignment = (max_alignment * alignment) // math.gcd(max_alignment, alignment)
-            stream.seek(_align_up(stream.tell(), alignment))
-            _write(stream, self._u32(stream.tell()), data_offsets_offset + 4 * i)
-            stream.write(file.data) # type: ignore
-
-        size = stream.tell()
-        stream.seek(0)
-        stream.write(_Header.pack(b"GAR\x02", size, len(file_types), len(self.files), types_offset, file_info_offset, data_offsets_offset, b"jenkins"))
-
-        return max_alignment
-
-    def _u32(self, value: int) -> bytes:
-        return struct.pack('<I', value)
-
+        files = self.files.values()
+        layout = [(file.name, file.type) for file in files]
+        if self._plan is None or self._plan.files != tuple(layout):
+            self._plan = GarWriterPlan(layout)
+        return self._plan.write(stream, [file.data for file in files],
+                                [self._get_alignment_for_file(file) for file in files])
@@ -0,0 +1,94 @@
+"""Comparison of two archives, entry by entry, without extracting them.
+
+Entries with different sizes are reported as changed right away. Entries of equal size are
+compared by content hash when the hashes of both archives are known (e.g. from an asset index),
+so that their data is not read at all; otherwise their data is compared, in place for mapped
+archives.
+"""
+import typing
+
+from jktool import gar
+
+# Comparing slices of this size as bytes is much faster than comparing memoryviews directly
+# (which is done element by element).
+_COMPARE_CHUNK_SIZE = 0x10000
+
+
+class EntryChange(typing.NamedTuple):
+    name: str
+    old_offset: int
+    new_offset: int
+    old_size: int
+    new_size: int
+
+
+class ArchiveDiff(typing.NamedTuple):
+    # (name, offset, size)
+    added: typing.List[typing.Tuple[str, int, int]]
+    removed: typing.List[typing.Tuple[str, int, int]]
+    # Entries whose data changed
+    changed: typing.List[EntryChange]
+    # Entries with the same data at a different offset
+    moved: typing.List[EntryChange]
+    unchanged: int
+    old_alignment: int
+    new_alignment: int
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed or self.moved) and \
+            self.old_alignment == self.new_alignment
+
+    def to_json(self) -> dict:
+        def change(c: EntryChange) -> dict:
+            return {"name": c.name, "offset": [c.old_offset, c.new_offset], "size": [c.old_size, c.new_size]}
+        return {
+            "added": [{"name": name, "offset": offset, "size": size} for name, offset, size in self.added],
+            "removed": [{"name": name, "offset": offset, "size": size} for name, offset, size in self.removed],
+            "changed": [change(c) for c in self.changed],
+            "moved": [change(c) for c in self.moved],
+            "unchanged": self.unchanged,
+            "alignment": [self.old_alignment, self.new_alignment],
+        }
+
+
+def data_equal(a: typing.Union[bytes, memoryview], b: typing.Union[bytes, memoryview]) -> bool:
+    """Compares two buffers, stopping at the first chunk that differs."""
+    if len(a) != len(b):
+        return False
+    a, b = memoryview(a), memoryview(b)
+    for i in range(0, len(a), _COMPARE_CHUNK_SIZE):
+        if a[i:i + _COMPARE_CHUNK_SIZE].tobytes() != b[i:i + _COMPARE_CHUNK_SIZE].tobytes():
+            return False
+    return True
+
+
+def diff_archives(old: gar.Gar, new: gar.Gar, old_hashes: typing.Optional[typing.Mapping[str, str]] = None,
+                  new_hashes: typing.Optional[typing.Mapping[str, str]] = None) -> ArchiveDiff:
+    """Compares two archives. old_hashes and new_hashes map file names to content hashes, if known."""
+    old_files = old.get_files()
+    new_files = new.get_files()
+    added = []
+    changed = []
+    moved = []
+    unchanged = 0
+    for name, new_file in new_files.items():
+        old_file = old_files.get(name)
+        if old_file is None:
+            added.append((name, new_file.offset, len(new_file.data)))
+            continue
+        change = EntryChange(name, old_file.offset, new_file.offset, len(old_file.data), len(new_file.data))
+        old_hash = old_hashes.get(name) if old_hashes is not None else None
+        new_hash = new_hashes.get(name) if new_hashes is not None else None
+        if old_hash is not None and new_hash is not None and len(old_file.data) == len(new_file.data):
+            equal = old_hash == new_hash
+        else:
+            equal = data_equal(old_file.data, new_file.data)
+        if not equal:
+            changed.append(change)
+        elif old_file.offset != new_file.offset:
+            moved.append(change)
+        else:
+            unchanged += 1
+    removed = [(name, file.offset, len(file.data)) for name, file in old_files.items() if name not in new_files]
+    return ArchiveDiff(added, removed, changed, moved, unchanged,
+                       old.guess_default_alignment(), new.guess_default_alignment())
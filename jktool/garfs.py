@@ -0,0 +1,125 @@
+"""Virtual filesystem over several archives and loose directories.
+
+Sources are mounted with a priority. When several sources contain the same file, the one
+with the highest priority wins (and among equal priorities, the most recently mounted one),
+which is how mods override files from the base game:
+
+    fs = GarFS()
+    fs.mount("romfs/ui/common.gar")
+    fs.mount("mods/ui", priority=1)
+    data = fs.read("layout/title.mfl")
+
+Files in archives are served straight from memory-mapped archives without copying.
+"""
+import fnmatch
+from pathlib import Path
+import typing
+
+from jktool.archivecache import ArchiveCache
+
+
+class _Mount(typing.NamedTuple):
+    path: Path
+    is_archive: bool
+    priority: int
+    # Files are visible as prefix + name
+    prefix: str
+    # Used to break priority ties: later mounts win
+    order: int
+
+
+class GarFS:
+    """Overlay of archives and directories, exposed as a single read-only namespace.
+
+    Archives are opened through cache, which can be shared with other users. By default, each
+    GarFS has its own cache that keeps at most max_open_archives archives mapped at the same time.
+
+    The files of every source are listed when first needed and the listing is kept until the next
+    mount, unmount or refresh: files that are added to a source afterwards are not visible until
+    refresh() is called. Reading a file that was removed from its source since then falls back to
+    the next source that has it, or raises FileNotFoundError.
+    """
+
+    def __init__(self, max_open_archives: int = 16, cache: typing.Optional[ArchiveCache] = None) -> None:
+        self.cache = cache if cache is not None else ArchiveCache(max_archives=max_open_archives)
+        self._mounts: typing.List[_Mount] = []
+        # Winning mount for every name (built when needed)
+        self._resolved: typing.Optional[typing.Dict[str, _Mount]] = None
+        self._next_order = 0
+
+    def mount(self, path: typing.Union[str, Path], priority: int = 0, prefix: str = "") -> None:
+        """Mounts an archive (a file) or a directory. Files are visible under prefix."""
+        path = Path(path)
+        if not path.is_dir() and not path.is_file():
+            raise FileNotFoundError(f"{path}: no such file or directory")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        self._mounts.append(_Mount(path, path.is_file(), priority, prefix, self._next_order))
+        self._next_order += 1
+        self._resolved = None
+
+    def unmount(self, path: typing.Union[str, Path]) -> None:
+        path = Path(path)
+        mounts = [mount for mount in self._mounts if mount.path != path]
+        if len(mounts) == len(self._mounts):
+            raise ValueError(f"{path} is not mounted")
+        self._mounts = mounts
+        self._resolved = None
+
+    def refresh(self) -> None:
+        """Lists the files of all sources again, picking up files that were added or removed."""
+        self._resolved = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._get_resolved()
+
+    def names(self) -> typing.List[str]:
+        """Returns the names of all visible files, sorted."""
+        return sorted(self._get_resolved())
+
+    def glob(self, pattern: str) -> typing.List[str]:
+        return fnmatch.filter(self.names(), pattern)
+
+    def get_source(self, name: str) -> Path:
+        """Returns the path of the archive or directory that provides a file."""
+        return self._get_mount(name).path
+
+    def read(self, name: str) -> typing.Union[memoryview, bytes]:
+        """Returns the contents of a file. Data from archives is a view into the mapped archive."""
+        mount = self._get_mount(name)
+        try:
+            return self._read(mount, name)
+        except (KeyError, FileNotFoundError):
+            # Removed from its source after the listing: list the sources again.
+            self.refresh()
+        try:
+            return self._read(self._get_mount(name), name)
+        except (KeyError, FileNotFoundError):
+            raise FileNotFoundError(f"{name}: no such file in any mounted source") from None
+
+    def _read(self, mount: _Mount, name: str) -> typing.Union[memoryview, bytes]:
+        rel_name = name[len(mount.prefix):]
+        if mount.is_archive:
+            return self.cache.open(mount.path).get_files()[rel_name].data
+        return (mount.path / rel_name).read_bytes()
+
+    def _get_mount(self, name: str) -> _Mount:
+        try:
+            return self._get_resolved()[name]
+        except KeyError:
+            raise FileNotFoundError(f"{name}: no such file in any mounted source") from None
+
+    def _get_resolved(self) -> typing.Dict[str, _Mount]:
+        if self._resolved is None:
+            resolved: typing.Dict[str, _Mount] = dict()
+            # Lowest priority first, so that winners overwrite the others.
+            for mount in sorted(self._mounts, key=lambda m: (m.priority, m.order)):
+                for name in self._list_mount(mount):
+                    resolved[mount.prefix + name] = mount
+            self._resolved = resolved
+        return self._resolved
+
+    def _list_mount(self, mount: _Mount) -> typing.Iterable[str]:
+        if mount.is_archive:
+            return self.cache.open(mount.path).get_files().keys()
+        return (p.relative_to(mount.path).as_posix() for p in mount.path.rglob("*") if p.is_file())
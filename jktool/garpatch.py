@@ -0,0 +1,320 @@
+"""Compact patches that turn one archive into another.
+
+A patch lists the entries of the new archive. Entries that also exist in the old archive
+(under any name) are copied from it, and changed entries are stored either whole or as a
+block delta against the old entry with the same name, whichever is smaller. Applying a patch
+rebuilds the new archive with GarWriter.
+
+Archives that GarWriter cannot reproduce exactly (e.g. because they were made by another tool)
+are patched as a whole instead, with a single block delta over the entire file.
+
+Patches record hashes of both archives: applying a patch to the wrong archive, or producing
+anything other than the exact new archive, is an error.
+"""
+import hashlib
+import io
+import struct
+import typing
+import zlib
+
+from jktool import gar
+from jktool.gardiff import data_equal
+
+_MAGIC = b"GARPATCH"
+_VERSION = 1
+_Header = struct.Struct("<8sIB20s20sQ")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_DeltaCopy = struct.Struct("<BQI")
+_DeltaInsert = struct.Struct("<BI")
+
+MODE_ENTRIES = 0
+MODE_RAW = 1
+
+_ENTRY_COPY = 0
+_ENTRY_DATA = 1
+_ENTRY_DELTA = 2
+
+_DELTA_COPY = 0
+_DELTA_INSERT = 1
+
+BLOCK_SIZE = 0x1000
+
+
+def _hash(data: typing.Union[bytes, memoryview]) -> bytes:
+    return hashlib.blake2b(data, digest_size=20).digest()
+
+
+def _block_key(block: typing.Union[bytes, memoryview]) -> bytes:
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def _segments(size: int, starts: typing.Iterable[int]) -> typing.List[typing.Tuple[int, int]]:
+    bounds = sorted({0, *(start for start in starts if 0 <= start < size)}) + [size]
+    return list(zip(bounds, bounds[1:]))
+
+
+def make_delta(old: typing.Union[bytes, memoryview], new: typing.Union[bytes, memoryview],
+               block_size: int = BLOCK_SIZE, old_starts: typing.Iterable[int] = (),
+               new_starts: typing.Iterable[int] = ()) -> bytes:
+    """Encodes new as copies of blocks from old and inserted data.
+
+    Blocks of new are looked up at the same offset in old first, then among all blocks of old,
+    so both in-place edits and moved data are found. Blocks are aligned to the start of the
+    buffers and to old_starts/new_starts (e.g. the offsets of archive entries), which lets data
+    that moved by an arbitrary amount be matched as long as it starts at one of those offsets.
+    """
+    old, new = memoryview(old), memoryview(new)
+    old_blocks: typing.Optional[typing.Dict[bytes, int]] = None
+    ops: typing.List[list] = []
+
+    def add_copy(offset: int, size: int) -> None:
+        if ops and ops[-1][0] == _DELTA_COPY and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1][2] += size
+        else:
+            ops.append([_DELTA_COPY, offset, size])
+
+    def add_insert(start: int, end: int) -> None:
+        if ops and ops[-1][0] == _DELTA_INSERT and ops[-1][2] == start:
+            ops[-1][2] = end
+        else:
+            ops.append([_DELTA_INSERT, start, end])
+
+    for segment_start, segment_end in _segments(len(new), new_starts):
+        for start in range(segment_start, segment_end, block_size):
+            block = new[start:min(start + block_size, segment_end)]
+            if data_equal(block, old[start:start + len(block)]):
+                add_copy(start, len(block))
+                continue
+            if old_blocks is None:
+                old_blocks = dict()
+                for old_start, old_end in _segments(len(old), old_starts):
+                    for offset in range(old_start, old_end - block_size + 1, block_size):
+                        old_blocks.setdefault(_block_key(old[offset:offset + block_size]), offset)
+            offset = old_blocks.get(_block_key(block), -1) if len(block) == block_size else -1
+            if offset >= 0 and data_equal(block, old[offset:offset + block_size]):
+                add_copy(offset, block_size)
+            else:
+                add_insert(start, start + len(block))
+
+    delta = bytearray()
+    for op, a, b in ops:
+        if op == _DELTA_COPY:
+            delta += _DeltaCopy.pack(op, a, b)
+        else:
+            delta += _DeltaInsert.pack(op, b - a)
+            delta += new[a:b]
+    return bytes(delta)
+
+
+def apply_delta(old: typing.Union[bytes, memoryview], delta: typing.Union[bytes, memoryview],
+                stream: typing.BinaryIO) -> None:
+    """Writes the data encoded by a delta to stream."""
+    old, delta = memoryview(old), memoryview(delta)
+    pos = 0
+    while pos < len(delta):
+        op = delta[pos]
+        if op == _DELTA_COPY:
+            if pos + _DeltaCopy.size > len(delta):
+                raise ValueError("Invalid delta: truncated copy")
+            _, offset, size = _DeltaCopy.unpack_from(delta, pos)
+            pos += _DeltaCopy.size
+            if offset + size > len(old):
+                raise ValueError("Invalid delta: copy out of bounds")
+            stream.write(old[offset:offset + size])
+        elif op == _DELTA_INSERT:
+            if pos + _DeltaInsert.size > len(delta):
+                raise ValueError("Invalid delta: truncated insert")
+            _, size = _DeltaInsert.unpack_from(delta, pos)
+            pos += _DeltaInsert.size
+            if pos + size > len(delta):
+                raise ValueError("Invalid delta: truncated insert")
+            stream.write(delta[pos:pos + size])
+            pos += size
+        else:
+            raise ValueError(f"Invalid delta: unknown operation {op}")
+
+
+def _delta_to_bytes(old: typing.Union[bytes, memoryview], delta: bytes) -> bytes:
+    out = io.BytesIO()
+    apply_delta(old, delta, out)
+    return out.getvalue()
+
+
+def _write_name(stream: typing.BinaryIO, name: str) -> None:
+    encoded = name.encode("utf-8")
+    stream.write(_U16.pack(len(encoded)))
+    stream.write(encoded)
+
+
+def _write_blob(stream: typing.BinaryIO, blob: bytes) -> None:
+    stream.write(_U32.pack(len(blob)))
+    stream.write(blob)
+
+
+class _Reader:
+    def __init__(self, data: memoryview) -> None:
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, st: struct.Struct) -> tuple:
+        if self.pos + st.size > len(self.data):
+            raise ValueError("Truncated patch")
+        values = st.unpack_from(self.data, self.pos)
+        self.pos += st.size
+        return values
+
+    def read(self, size: int) -> memoryview:
+        if self.pos + size > len(self.data):
+            raise ValueError("Truncated patch")
+        data = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def name(self) -> str:
+        return self.read(self.unpack(_U16)[0]).tobytes().decode("utf-8")
+
+    def blob(self) -> memoryview:
+        return self.read(self.unpack(_U32)[0])
+
+
+def _try_parse(archive_data: memoryview) -> typing.Optional[gar.Gar]:
+    try:
+        return gar.Gar(archive_data)
+    except (ValueError, struct.error):
+        return None
+
+
+def _can_rebuild(archive: gar.Gar, archive_data: memoryview) -> bool:
+    """Returns whether GarWriter reproduces an archive exactly."""
+    rebuilt = io.BytesIO()
+    try:
+        gar.GarWriter.from_gar(archive).write(rebuilt)
+    except IndexError:
+        # GarWriter derives file types from extensions and cannot write names without one.
+        return False
+    return data_equal(rebuilt.getbuffer(), archive_data)
+
+
+def _get_entry_offsets(archive: typing.Optional[gar.Gar]) -> typing.List[int]:
+    return [file.offset for file in archive.get_files().values()] if archive is not None else []
+
+
+def create_patch(old_data: typing.Union[bytes, memoryview], new_data: typing.Union[bytes, memoryview],
+                 stream: typing.BinaryIO) -> int:
+    """Writes a patch from old_data to new_data (both archives) and returns the patch mode."""
+    old_data, new_data = memoryview(old_data), memoryview(new_data)
+    old_archive, new_archive = _try_parse(old_data), _try_parse(new_data)
+    mode = MODE_RAW
+    if old_archive is not None and new_archive is not None and _can_rebuild(new_archive, new_data):
+        mode = MODE_ENTRIES
+    stream.write(_Header.pack(_MAGIC, _VERSION, mode, _hash(old_data), _hash(new_data), len(new_data)))
+
+    if mode == MODE_RAW:
+        delta = make_delta(old_data, new_data, old_starts=_get_entry_offsets(old_archive),
+                           new_starts=_get_entry_offsets(new_archive))
+        _write_blob(stream, zlib.compress(delta))
+        return mode
+
+    old_files = old_archive.get_files()  # type: ignore
+    # (size, hash) -> name, for finding entries that were renamed or duplicated (built when needed)
+    old_by_hash: typing.Optional[typing.Dict[typing.Tuple[int, bytes], str]] = None
+
+    new_files = new_archive.get_files()  # type: ignore
+    stream.write(_U32.pack(new_archive.guess_default_alignment()))  # type: ignore
+    stream.write(_U32.pack(len(new_files)))
+    for name, file in new_files.items():
+        _write_name(stream, name)
+        old_file = old_files.get(name)
+        if old_file is not None and data_equal(old_file.data, file.data):
+            stream.write(_U8.pack(_ENTRY_COPY))
+            _write_name(stream, name)
+            continue
+
+        if old_by_hash is None:
+            old_by_hash = dict()
+            for old_name, f in old_files.items():
+                old_by_hash.setdefault((len(f.data), _hash(f.data)), old_name)
+        same_data_name = old_by_hash.get((len(file.data), _hash(file.data)))
+        if same_data_name is not None:
+            stream.write(_U8.pack(_ENTRY_COPY))
+            _write_name(stream, same_data_name)
+            continue
+
+        compressed = zlib.compress(file.data)
+        if old_file is not None:
+            delta = zlib.compress(make_delta(old_file.data, file.data))
+            if len(delta) < len(compressed):
+                stream.write(_U8.pack(_ENTRY_DELTA))
+                _write_name(stream, name)
+                _write_blob(stream, delta)
+                continue
+        stream.write(_U8.pack(_ENTRY_DATA))
+        _write_blob(stream, compressed)
+    return mode
+
+
+class _HashingWriter:
+    def __init__(self, stream: typing.BinaryIO) -> None:
+        self.stream = stream
+        self.hash = hashlib.blake2b(digest_size=20)
+        self.size = 0
+
+    def write(self, data: typing.Union[bytes, memoryview]) -> int:
+        self.hash.update(data)
+        self.size += len(data)
+        return self.stream.write(data)
+
+    def tell(self) -> int:
+        return self.size
+
+
+def apply_patch(old_data: typing.Union[bytes, memoryview], patch: typing.Union[bytes, memoryview],
+                stream: typing.BinaryIO) -> None:
+    """Writes the new archive to stream (sequentially). Raises ValueError if the patch does not apply."""
+    try:
+        _apply_patch(memoryview(old_data), memoryview(patch), stream)
+    except (zlib.error, struct.error, UnicodeDecodeError, IndexError) as e:
+        # Corrupted patches fail in all sorts of ways; report them like any other invalid patch.
+        raise ValueError(f"Invalid patch: {e}") from e
+
+
+def _apply_patch(old_data: memoryview, patch: memoryview, stream: typing.BinaryIO) -> None:
+    reader = _Reader(patch)
+    magic, version, mode, old_hash, new_hash, new_size = reader.unpack(_Header)
+    if magic != _MAGIC:
+        raise ValueError("Not an archive patch")
+    if version != _VERSION:
+        raise ValueError(f"Unsupported patch version: {version}")
+    if _hash(old_data) != old_hash:
+        raise ValueError("The patch does not apply to this archive")
+
+    out = _HashingWriter(stream)
+    if mode == MODE_RAW:
+        apply_delta(old_data, zlib.decompress(reader.blob()), out)  # type: ignore
+    elif mode == MODE_ENTRIES:
+        old_files = gar.Gar(old_data).get_files()
+        writer = gar.GarWriter()
+        writer.set_default_alignment(reader.unpack(_U32)[0])
+        for _ in range(reader.unpack(_U32)[0]):
+            name = reader.name()
+            op = reader.unpack(_U8)[0]
+            if op == _ENTRY_DATA:
+                data: typing.Union[bytes, memoryview] = zlib.decompress(reader.blob())
+            elif op in (_ENTRY_COPY, _ENTRY_DELTA):
+                old_name = reader.name()
+                if old_name not in old_files:
+                    raise ValueError(f"Invalid patch: {old_name} is not in the old archive")
+                data = old_files[old_name].data
+                if op == _ENTRY_DELTA:
+                    data = _delta_to_bytes(data, zlib.decompress(reader.blob()))
+            else:
+                raise ValueError(f"Invalid patch: unknown entry operation {op}")
+            writer.files[name] = gar.GarWriter.File(name, data)
+        writer.write(out)  # type: ignore
+    else:
+        raise ValueError(f"Invalid patch: unknown mode {mode}")
+
+    if out.size != new_size or out.hash.digest() != new_hash:
+        raise ValueError("The patched archive does not match the expected result")
@@ -1,68 +1,223 @@
 # Copyright 2018 leoetlino <leo@leolam.fr>
 # Licensed under GPLv2+
 import argparse
-import io
 import os
 from pathlib import Path
-import shutil
 import struct
 import sys
 import typing
 
 from . import gar
+from .instrument import phase, run_instrumented
 
-def gar_extract(args) -> None:
-    archive_path = Path(args.gar)
+def extract_archive(archive_path: Path) -> typing.Iterator[Path]:
+    """Extracts an archive next to it (in a directory named after it) and yields the written files."""
     with archive_path.open('rb') as f:
-        archive = gar.Gar(f.read())
-        result_dir = Path(archive_path.parent / archive_path.stem)
-        result_dir.mkdir(exist_ok=True)
-        for name, file in archive.get_files().items():
-            target_path = result_dir / Path(name)
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            with target_path.open('wb') as target_file:
-                target_file.write(file.data)
-            print(target_path)
-        file_list = "\n".join(archive.get_files().keys())
-        (result_dir / "__list__.txt").write_text(file_list)
+        with phase('read'):
+            archive = gar.Gar(f.read())
+        with phase('extract'):
+            result_dir = Path(archive_path.parent / archive_path.stem)
+            result_dir.mkdir(exist_ok=True)
+            for name, file in archive.get_files().items():
+                target_path = result_dir / Path(name)
+                target_path.parent.mkdir(parents=True, exist_ok=True)
+                with target_path.open('wb') as target_file:
+                    target_file.write(file.data)
+                yield target_path
+            file_list = "\n".join(archive.get_files().keys())
+            (result_dir / "__list__.txt").write_text(file_list)
+
+def gar_extract(args) -> None:
+    for path in extract_archive(Path(args.gar)):
+        print(path)
 
 def gar_list(args) -> None:
     with open(args.gar, 'rb') as f:
-        archive = gar.Gar(f.read())
+        with phase('read'):
+            archive = gar.Gar(f.read())
         for name, file in archive.get_files().items():
             extra_info = "[0x%x bytes]" % len(file.data)
             extra_info += " @ 0x%x" % file.offset
             print("%s%s" % (name, ' ' + extra_info if not args.name_only else ''))
 
 def _write_gar(writer: gar.GarWriter, dest_stream: typing.BinaryIO) -> None:
-    buf = io.BytesIO()
-    buf.seek(0)
-    shutil.copyfileobj(buf, dest_stream)
-
-def gar_create(args) -> None:
-    directory: Path = Path(args.dir)
-    dest_file: str = args.dest
+    # Archives are written sequentially, so this also works for pipes.
+    with phase('write'):
+        writer.write(dest_stream)
 
+def _check_pack_dir(directory: Path) -> None:
     if not directory.is_dir():
         sys.stderr.write(f'error: {directory} is not a directory. Did you mix up the argument order? (directory that should be archived first, then the target archive)\n')
         sys.exit(1)
 
+def make_writer(directory: Path, default_alignment: typing.Optional[int]) -> gar.GarWriter:
+    """Creates a writer for the files listed in the __list__.txt of an extracted archive."""
     writer = gar.GarWriter()
 
-    if args.default_alignment:
-        writer.set_default_alignment(args.default_alignment)
+    if default_alignment:
+        writer.set_default_alignment(default_alignment)
 
-    dest_stream: typing.BinaryIO = open(dest_file, 'wb') if dest_file != '-' else sys.stdout.buffer
+    with phase('read'):
+        files = (directory / "__list__.txt").read_text().splitlines()
+        for file in files:
+            writer.files[file] = gar.GarWriter.File(file, (directory / file).read_bytes())
+    return writer
+
+def gar_create(args) -> None:
+    directory: Path = Path(args.dir)
+    dest_file: str = args.dest
 
-    files = (Path(directory) / "__list__.txt").read_text().splitlines()
-    for file in files:
-        writer.files[file] = gar.GarWriter.File(file, (directory / file).read_bytes())
+    _check_pack_dir(directory)
+    writer = make_writer(directory, args.default_alignment)
 
+    dest_stream: typing.BinaryIO = open(dest_file, 'wb') if dest_file != '-' else sys.stdout.buffer
     _write_gar(writer, dest_stream)
 
+def write_archive(writer: gar.GarWriter, dest: Path) -> None:
+    """Writes an archive to a temporary file first so that readers never see a partial archive."""
+    tmp_path = dest.with_name(dest.name + '.tmp')
+    with tmp_path.open('wb') as f:
+        _write_gar(writer, f)
+    tmp_path.replace(dest)
+
+def gar_watch(args) -> None:
+    from .watch import PollingWatcher
+
+    directory: Path = Path(args.dir)
+    dest = Path(args.dest)
+
+    _check_pack_dir(directory)
+    writer = make_writer(directory, args.default_alignment)
+    write_archive(writer, dest)
+    print(dest, flush=True)
+
+    watcher = PollingWatcher([directory], interval=args.interval)
+    sys.stderr.write('watching for changes...\n')
+    try:
+        for changed in watcher.iter_changes():
+            names = {path.relative_to(directory).as_posix() for path in changed}
+            try:
+                if '__list__.txt' in names:
+                    writer = make_writer(directory, args.default_alignment)
+                else:
+                    names &= writer.files.keys()
+                    if not names:
+                        continue
+                    # Only re-read the files that changed; the others are kept in memory.
+                    for name in names:
+                        writer.files[name] = gar.GarWriter.File(name, (directory / name).read_bytes())
+                write_archive(writer, dest)
+            except OSError as e:
+                sys.stderr.write(f'error: {e}\n')
+                continue
+            print(dest, flush=True)
+    except KeyboardInterrupt:
+        pass
+
+def gar_index(args) -> None:
+    from .assetindex import AssetIndex, DEFAULT_INDEX_NAME
+
+    root = Path(args.root)
+    if not root.is_dir():
+        sys.stderr.write(f'error: {root} is not a directory\n')
+        sys.exit(1)
+    with AssetIndex(root / DEFAULT_INDEX_NAME) as index:
+        with phase('index'):
+            stats = index.refresh(args.jobs)
+    for path, error in stats.errors:
+        sys.stderr.write(f'error: {path}: {error}\n')
+    print(f'{stats.scanned} archives scanned, {stats.unchanged} unchanged, {stats.removed} removed')
+
+def gar_find(args) -> None:
+    from .assetindex import AssetIndex, DEFAULT_INDEX_NAME, find_index
+
+    index_path = Path(args.index) if args.index else find_index(Path.cwd())
+    if index_path is None or not index_path.is_file():
+        sys.stderr.write(f'error: no index found (create one with "gar index DIR", which writes DIR/{DEFAULT_INDEX_NAME})\n')
+        sys.exit(1)
+    with AssetIndex(index_path) as index:
+        with phase('find'):
+            results = index.find(args.pattern)
+        for file in results:
+            archive_path = os.path.relpath(index.get_archive_path(file))
+            print('%s:%s [0x%x bytes] @ 0x%x' % (archive_path, file.name, file.size, file.offset))
+    if not results:
+        sys.exit(1)
+
+def _get_indexed_hashes(path: Path) -> typing.Optional[typing.Dict[str, str]]:
+    """Returns the content hashes of the files in an archive from the asset index that covers it, if it is up to date."""
+    from .assetindex import AssetIndex, find_index
+
+    index_path = find_index(path.parent)
+    if index_path is None:
+        return None
+    with AssetIndex(index_path) as index:
+        return index.get_hashes(path)
+
+def gar_diff(args) -> None:
+    from .gardiff import diff_archives
+
+    with phase('read'):
+        old, new = gar.open_gar(args.old), gar.open_gar(args.new)
+        old_hashes = new_hashes = None
+        if not args.no_index:
+            old_hashes, new_hashes = _get_indexed_hashes(Path(args.old)), _get_indexed_hashes(Path(args.new))
+    with phase('diff'):
+        diff = diff_archives(old, new, old_hashes, new_hashes)
+    if args.json:
+        import json
+        print(json.dumps(diff.to_json(), indent=2))
+    else:
+        if diff.old_alignment != diff.new_alignment:
+            print('alignment: 0x%x -> 0x%x' % (diff.old_alignment, diff.new_alignment))
+        for name, offset, size in diff.added:
+            print('A %s [0x%x bytes] @ 0x%x' % (name, size, offset))
+        for name, offset, size in diff.removed:
+            print('D %s [0x%x bytes] @ 0x%x' % (name, size, offset))
+        for c in diff.changed:
+            print('M %s [0x%x -> 0x%x bytes] @ 0x%x -> 0x%x' % (c.name, c.old_size, c.new_size, c.old_offset, c.new_offset))
+        for c in diff.moved:
+            print('O %s @ 0x%x -> 0x%x' % (c.name, c.old_offset, c.new_offset))
+    if not diff.is_empty():
+        sys.exit(1)
+
+def gar_patch_create(args) -> None:
+    from . import garpatch
+
+    with phase('read'):
+        old, new = Path(args.old).read_bytes(), Path(args.new).read_bytes()
+    with phase('patch'), open(args.patch, 'wb') as f:
+        mode = garpatch.create_patch(old, new, f)
+    if mode == garpatch.MODE_RAW:
+        sys.stderr.write('note: the archives cannot be rebuilt entry by entry, so the whole file was patched\n')
+    print('%s [0x%x bytes]' % (args.patch, os.path.getsize(args.patch)))
+
+def gar_patch_apply(args) -> None:
+    from . import garpatch
+
+    dest = Path(args.dest)
+    tmp_path = dest.with_name(dest.name + '.tmp')
+    with phase('read'):
+        old, patch = Path(args.old).read_bytes(), Path(args.patch).read_bytes()
+    try:
+        with phase('patch'), tmp_path.open('wb') as f:
+            garpatch.apply_patch(old, patch, f)
+        tmp_path.replace(dest)
+    except ValueError as e:
+        sys.stderr.write(f'error: {e}\n')
+        sys.exit(1)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    print(dest)
+
 def main() -> None:
     parser = argparse.ArgumentParser(description='Tool to manipulate GAR archives.')
 
+    parser.add_argument('--profile', metavar='FILE', help='Write a cProfile profile (pstats format) to this file')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print the wall time, CPU time and peak memory of every phase (tracing memory slows things down)')
+
     subparsers = parser.add_subparsers(dest='command', help='Command')
     subparsers.required = True
 
@@ -82,5 +237,44 @@ def main() -> None:
     c_parser.add_argument('dest', help='Destination archive')
     c_parser.set_defaults(func=gar_create)
 
+    w_parser = subparsers.add_parser('watch', description='Create an archive and rebuild it whenever the directory changes')
+    w_parser.add_argument('-n', '--default-alignment', type=lambda n: int(n, 0),
+                          help='Set the default alignment for files. Defaults to 4.')
+    w_parser.add_argument('--interval', type=float, default=0.5, help='Polling interval in seconds')
+    w_parser.add_argument('dir', help='Directory to pack')
+    w_parser.add_argument('dest', help='Destination archive')
+    w_parser.set_defaults(func=gar_watch)
+
+    i_parser = subparsers.add_parser('index', description='Index the archives in a directory tree (only changed archives are rescanned)')
+    i_parser.add_argument('-j', '--jobs', type=int, help='Number of worker processes')
+    i_parser.add_argument('root', nargs='?', default='.', help='Directory to index (default: current directory)')
+    i_parser.set_defaults(func=gar_index)
+
+    f_parser = subparsers.add_parser('find', description='Find the archives that contain a file')
+    f_parser.add_argument('--index', help='Index file (default: look for one in the current directory and its parents)')
+    f_parser.add_argument('pattern', help='File name or path inside archives; may contain glob wildcards')
+    f_parser.set_defaults(func=gar_find)
+
+    d_parser = subparsers.add_parser('diff', description='Compare two archives. Lists added (A), removed (D), modified (M) and moved (O) files; exits with status 1 if the archives differ')
+    d_parser.add_argument('--json', action='store_true', help='Print the differences as JSON')
+    d_parser.add_argument('--no-index', action='store_true', help='Compare file data even if the archives are in an up-to-date asset index (see "gar index")')
+    d_parser.add_argument('old', help='Path to a GAR archive')
+    d_parser.add_argument('new', help='Path to a GAR archive')
+    d_parser.set_defaults(func=gar_diff)
+
+    p_parser = subparsers.add_parser('patch', description='Create or apply patches between two versions of an archive')
+    p_subparsers = p_parser.add_subparsers(dest='patch_command', help='Command')
+    p_subparsers.required = True
+    pc_parser = p_subparsers.add_parser('create', description='Create a patch that turns OLD into NEW')
+    pc_parser.add_argument('old', help='Path to the original GAR archive')
+    pc_parser.add_argument('new', help='Path to the modified GAR archive')
+    pc_parser.add_argument('patch', help='Destination patch')
+    pc_parser.set_defaults(func=gar_patch_create)
+    pa_parser = p_subparsers.add_parser('apply', description='Apply a patch to an archive and write the result to DEST')
+    pa_parser.add_argument('old', help='Path to the original GAR archive')
+    pa_parser.add_argument('patch', help='Path to a patch')
+    pa_parser.add_argument('dest', help='Destination archive (may be the original archive)')
+    pa_parser.set_defaults(func=gar_patch_apply)
+
     args = parser.parse_args()
-    args.func(args)
+    run_instrumented(lambda: args.func(args), args.profile, args.timings)
@@ -0,0 +1,163 @@
+"""Phase hooks for timing and profiling conversions.
+
+The tools mark their main phases (reading, parsing, emitting, building, writing...) with
+`phase`. Hooks that are registered with `add_hook` are notified when a phase starts and ends,
+so library users can collect the same metrics as `--timings` does:
+
+    timer = PhaseTimer()
+    add_hook(timer)
+    try:
+        lyttool.dump_source(data, "mfl", stream)
+    finally:
+        remove_hook(timer)
+    print(timer.stats)
+
+Phases can be nested. Without any hooks, entering a phase costs next to nothing.
+"""
+import contextlib
+import sys
+import time
+import typing
+
+
+class PhaseHook:
+    """Base class for phase hooks. Both methods do nothing by default."""
+
+    def phase_started(self, name: str) -> None:
+        pass
+
+    def phase_ended(self, name: str) -> None:
+        pass
+
+
+_hooks: typing.List[PhaseHook] = []
+
+
+def add_hook(hook: PhaseHook) -> None:
+    _hooks.append(hook)
+
+
+def remove_hook(hook: PhaseHook) -> None:
+    _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> typing.Iterator[None]:
+    if not _hooks:
+        yield
+        return
+    hooks = list(_hooks)
+    for hook in hooks:
+        hook.phase_started(name)
+    try:
+        yield
+    finally:
+        for hook in reversed(hooks):
+            hook.phase_ended(name)
+
+
+class PhaseStats(typing.NamedTuple):
+    name: str
+    # Number of times the phase was entered
+    count: int
+    wall_time: float
+    cpu_time: float
+    # Peak traced memory while in the phase, in bytes (0 if memory was not traced)
+    peak_memory: int
+
+
+class PhaseTimer(PhaseHook):
+    """Collects the wall time, CPU time and peak memory of every phase (accumulated by name).
+
+    If trace_memory is set, tracemalloc is started when the first phase starts. Tracing memory
+    makes allocations much slower, so wall and CPU times are only meaningful without it.
+    """
+
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.trace_memory = trace_memory
+        self._stats: typing.Dict[str, typing.List[float]] = dict()
+        # [name, wall start, cpu start, peak memory so far] for every phase that is in progress
+        self._open: typing.List[list] = []
+        self._started_tracing = False
+
+    def _get_peak_memory(self) -> int:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[1]
+
+    def _reset_peak_memory(self) -> None:
+        import tracemalloc
+        # Only available in Python 3.9+; peaks of nested phases are less precise without it.
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        if reset_peak and tracemalloc.is_tracing():
+            reset_peak()
+
+    def phase_started(self, name: str) -> None:
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            # The peak is shared by all phases: remember it for the outer ones before resetting it.
+            peak = self._get_peak_memory()
+            for entry in self._open:
+                entry[3] = max(entry[3], peak)
+            self._reset_peak_memory()
+        self._open.append([name, time.perf_counter(), time.process_time(), 0])
+
+    def phase_ended(self, name: str) -> None:
+        wall_end, cpu_end = time.perf_counter(), time.process_time()
+        open_name, wall_start, cpu_start, peak = self._open.pop()
+        assert open_name == name
+        peak = max(peak, self._get_peak_memory())
+        # Outer phases include everything that happened in this one.
+        if self._open:
+            self._open[-1][3] = max(self._open[-1][3], peak)
+        stats = self._stats.setdefault(name, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += wall_end - wall_start
+        stats[2] += cpu_end - cpu_start
+        stats[3] = max(stats[3], peak)
+
+        if not self._open and self._started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @property
+    def stats(self) -> typing.List[PhaseStats]:
+        """Stats for every phase, in the order in which phases first ended."""
+        return [PhaseStats(name, int(s[0]), s[1], s[2], int(s[3])) for name, s in self._stats.items()]
+
+    def report(self, stream: typing.TextIO = sys.stderr) -> None:
+        stream.write(f"{'phase':<16} {'count':>6} {'wall':>10} {'cpu':>10} {'peak mem':>12}\n")
+        for s in self.stats:
+            peak = f"{s.peak_memory / (1 << 20):10.2f}MB" if self.trace_memory else f"{'-':>12}"
+            stream.write(f"{s.name:<16} {s.count:>6} {s.wall_time * 1000:8.2f}ms {s.cpu_time * 1000:8.2f}ms {peak}\n")
+
+
+def run_instrumented(fn: typing.Callable[[], typing.Any], profile_path: typing.Optional[str] = None,
+                     timings: bool = False) -> typing.Any:
+    """Runs fn as a "total" phase, optionally under cProfile and with phase timings.
+
+    The profile is written to profile_path (in pstats format) and timings are printed to stderr.
+    """
+    timer = PhaseTimer() if timings else None
+    if timer:
+        add_hook(timer)
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with phase("total"):
+            return fn()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if timer:
+            remove_hook(timer)
+            timer.report()
@@ -0,0 +1,289 @@
+"""Structural diff of MFL layouts, computed directly on the binaries.
+
+Records are matched by identity rather than by position, so inserting a widget or a pane
+does not make everything after it look modified:
+
+* widgets by name (and by occurrence, for names that are used several times);
+* panes by name;
+* anims by name, and anim entries by (widget, value type).
+
+Records whose bytes did not change (ignoring indices into other tables) are not decoded at
+all, so comparing mostly identical layouts is fast.
+
+    glytdiff old.mfl new.mfl
+    glytdiff old_dir/ new_dir/ --json
+    glytdiff old.gar new.gar
+"""
+import argparse
+import json
+from pathlib import Path
+import struct
+import sys
+import typing
+
+from jktool.layoutindex import AnimEntryHeader, AnimHeader, LayoutIndex, WidgetHeader, get_layout_index
+from jktool.layout import WidgetType, WidgetValueType
+from jktool.widgettree import WidgetTree
+
+Data = typing.Union[bytes, memoryview]
+
+
+class LayoutChange(typing.NamedTuple):
+    # "added", "removed" or "changed"
+    op: str
+    # Slash-separated path, e.g. "panes/P_title/data/msgId" or "anims/in/entries/W_logo:ColorA/fps"
+    path: str
+    old: typing.Any = None
+    new: typing.Any = None
+
+    def to_json(self) -> dict:
+        d: typing.Dict[str, typing.Any] = {"op": self.op, "path": self.path}
+        # Added and removed records have no value (only added and removed fields do).
+        if self.op == "changed" or self.old is not None:
+            d["old"] = self.old
+        if self.op == "changed" or self.new is not None:
+            d["new"] = self.new
+        return d
+
+    def __str__(self) -> str:
+        if self.op == "added":
+            return f"+ {self.path}"
+        if self.op == "removed":
+            return f"- {self.path}"
+        return f"M {self.path}: {self.old!r} -> {self.new!r}"
+
+
+def _make_keys(names: typing.Sequence[str]) -> typing.List[str]:
+    """Returns unique keys for names: duplicated names get a #N suffix (N = occurrence)."""
+    counts: typing.Dict[str, int] = dict()
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+    seen: typing.Dict[str, int] = dict()
+    keys = []
+    for name in names:
+        if counts[name] == 1:
+            keys.append(name)
+            continue
+        n = seen.get(name, 0)
+        seen[name] = n + 1
+        keys.append(f"{name}#{n}")
+    return keys
+
+
+def _to_plain(value: typing.Any) -> typing.Any:
+    """Converts parsed construct containers to JSON-compatible values, dropping private fields."""
+    if isinstance(value, dict):
+        return {k: _to_plain(v) for k, v in value.items() if not k.startswith("_")}
+    if isinstance(value, list):
+        return [_to_plain(v) for v in value]
+    if isinstance(value, str):
+        # Also converts enum strings (EnumIntegerString)
+        return str(value)
+    if hasattr(value, "name") and isinstance(value, int):
+        return value.name
+    return value
+
+
+def _diff_values(path: str, old: typing.Any, new: typing.Any, changes: typing.List[LayoutChange]) -> None:
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in [*old, *(k for k in new if k not in old)]:
+            if key not in new:
+                changes.append(LayoutChange("removed", f"{path}/{key}", old=old[key]))
+            elif key not in old:
+                changes.append(LayoutChange("added", f"{path}/{key}", new=new[key]))
+            else:
+                _diff_values(f"{path}/{key}", old[key], new[key], changes)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for i, (a, b) in enumerate(zip(old, new)):
+            _diff_values(f"{path}/{i}", a, b, changes)
+    elif old != new:
+        changes.append(LayoutChange("changed", path, old, new))
+
+
+class _Side:
+    """One of the two layouts being compared."""
+
+    def __init__(self, data: Data) -> None:
+        self.data = memoryview(data)
+        self.index: LayoutIndex = get_layout_index(data)
+        self.tree = WidgetTree(self.index.get_widget_child_counts(data))
+        self.widget_keys = _make_keys(self.index.widgets_names)
+        self.pane_keys = _make_keys(self.index.panes_names)
+        self.anim_keys = _make_keys(self.index.anims_names)
+
+    def get_widget_bytes(self, idx: int) -> bytes:
+        start, end = self.index.get_widget_range(idx)
+        return self.data[start:end].tobytes()
+
+    def get_widget_context(self, idx: int) -> typing.Tuple[str, str]:
+        """Returns the parent key and (for pane widgets) the pane key of a widget."""
+        parent = self.tree.parent[idx]
+        parent_key = self.widget_keys[parent] if parent >= 0 else ""
+        flags, object_idx, _ = WidgetHeader.unpack_from(self.data, self.index.get_widget_range(idx)[0])
+        pane_key = ""
+        if (flags >> 4) & 3 == WidgetType.Pane and object_idx < len(self.pane_keys):
+            pane_key = self.pane_keys[object_idx]
+        return parent_key, pane_key
+
+    def parse_widget(self, idx: int) -> dict:
+        widget = _to_plain(self.index.parse_widget(self.data, idx))
+        del widget["widgetIdx"]
+        parent_key, pane_key = self.get_widget_context(idx)
+        widget["parent"] = parent_key
+        if widget["type"] == WidgetType.Pane.name:
+            widget["pane"] = pane_key
+            del widget["objectIdx"]
+        return widget
+
+    def get_pane_bytes(self, idx: int) -> bytes:
+        start, end = self.index.get_pane_range(idx)
+        return self.data[start:end].tobytes()
+
+    def parse_pane(self, idx: int) -> dict:
+        return _to_plain(self.index.parse_pane(self.data, idx))
+
+    def get_anim_header(self, idx: int) -> typing.Tuple[int, int]:
+        """Returns (fps, startFrame)."""
+        _, fps, start_frame = AnimHeader.unpack_from(self.data, self.index.anim_offsets[idx])
+        return fps, start_frame
+
+    def get_entry_keys(self, anim_idx: int) -> typing.List[str]:
+        ids = []
+        for offset in self.index.entry_offsets[anim_idx]:
+            widget_idx, value_type, *_ = AnimEntryHeader.unpack_from(self.data, offset)
+            widget_key = self.widget_keys[widget_idx] if widget_idx < len(self.widget_keys) else str(widget_idx)
+            try:
+                value_type_name = WidgetValueType(value_type).name
+            except ValueError:
+                value_type_name = str(value_type)
+            ids.append(f"{widget_key}:{value_type_name}")
+        return _make_keys(ids)
+
+    def get_entry_bytes(self, anim_idx: int, entry_idx: int) -> bytes:
+        # The widget index is skipped: widgets are compared by key.
+        start, end = self.index.get_entry_range(anim_idx, entry_idx)
+        return self.data[start + 2:end].tobytes()
+
+    def parse_entry(self, anim_idx: int, entry_idx: int) -> dict:
+        entry = _to_plain(self.index.parse_anim_entry_at(self.data, anim_idx, entry_idx))
+        del entry["widgetIdx"]
+        return entry
+
+
+def _match(old_keys: typing.Sequence[str], new_keys: typing.Sequence[str], path: str,
+           changes: typing.List[LayoutChange]) -> typing.List[typing.Tuple[str, int, int]]:
+    """Reports added and removed keys and returns (key, old index, new index) for the others."""
+    old_indices = {key: i for i, key in enumerate(old_keys)}
+    new_indices = {key: i for i, key in enumerate(new_keys)}
+    changes.extend(LayoutChange("removed", f"{path}/{key}") for key in old_keys if key not in new_indices)
+    changes.extend(LayoutChange("added", f"{path}/{key}") for key in new_keys if key not in old_indices)
+    return [(key, old_indices[key], new_indices[key]) for key in new_keys if key in old_indices]
+
+
+def diff_layouts(old_data: Data, new_data: Data) -> typing.List[LayoutChange]:
+    """Returns the differences between two layouts (binaries)."""
+    if bytes(old_data) == bytes(new_data):
+        return []
+    old, new = _Side(old_data), _Side(new_data)
+    changes: typing.List[LayoutChange] = []
+
+    # Paths use the field names of the YAML dumps.
+    for path, attr in (("name", "name"), ("mainWidgetsNames", "main_widgets_names"),
+                       ("playersNames", "players_names")):
+        _diff_values(path, getattr(old.index, attr), getattr(new.index, attr), changes)
+    layout_id = struct.Struct("<H")
+    _diff_values("layoutId", layout_id.unpack_from(old.data, 8)[0], layout_id.unpack_from(new.data, 8)[0], changes)
+
+    for key, i, j in _match(old.widget_keys, new.widget_keys, "widgets", changes):
+        if old.get_widget_bytes(i) == new.get_widget_bytes(j) and \
+                old.get_widget_context(i) == new.get_widget_context(j):
+            continue
+        _diff_values(f"widgets/{key}", old.parse_widget(i), new.parse_widget(j), changes)
+
+    for key, i, j in _match(old.pane_keys, new.pane_keys, "panes", changes):
+        if old.get_pane_bytes(i) != new.get_pane_bytes(j):
+            _diff_values(f"panes/{key}", old.parse_pane(i), new.parse_pane(j), changes)
+
+    for key, i, j in _match(old.anim_keys, new.anim_keys, "anims", changes):
+        path = f"anims/{key}"
+        (old_fps, old_start), (new_fps, new_start) = old.get_anim_header(i), new.get_anim_header(j)
+        _diff_values(f"{path}/fps", old_fps, new_fps, changes)
+        _diff_values(f"{path}/startFrame", old_start, new_start, changes)
+        for entry_key, k, m in _match(old.get_entry_keys(i), new.get_entry_keys(j), f"{path}/entries", changes):
+            if old.get_entry_bytes(i, k) != new.get_entry_bytes(j, m):
+                _diff_values(f"{path}/entries/{entry_key}", old.parse_entry(i, k), new.parse_entry(j, m), changes)
+
+    return changes
+
+
+def _load_layouts(spec: str) -> typing.Dict[str, typing.Callable[[], Data]]:
+    """Returns a loader for every layout in a file, a directory, an archive or an archive member."""
+    from jktool import lyttool
+
+    archive_path, member = lyttool.split_archive_spec(spec)
+    if archive_path and member:
+        return {member: lambda: lyttool.read_source(archive_path, member)}  # type: ignore
+    if archive_path:
+        files = lyttool.open_archive(archive_path).get_files()
+        return {name: (lambda name=name: files[name].data) for name in files if name.endswith(".mfl")}
+    path = Path(spec)
+    if path.is_dir():
+        return {p.relative_to(path).as_posix(): p.read_bytes for p in sorted(path.rglob("*.mfl"))}
+    return {path.name: path.read_bytes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare MFL layouts structurally.")
+    parser.add_argument("--json", action="store_true", help="Print the differences as JSON")
+    parser.add_argument("old", help="Layout, directory, archive or archive.gar:path/inside")
+    parser.add_argument("new", help="Layout, directory, archive or archive.gar:path/inside")
+    args = parser.parse_args()
+
+    try:
+        old_layouts, new_layouts = _load_layouts(args.old), _load_layouts(args.new)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"error: {e}\n")
+        sys.exit(1)
+    if len(old_layouts) == 1 and len(new_layouts) == 1:
+        # Two single layouts are compared even if their names differ.
+        name = next(iter(new_layouts))
+        old_layouts = {name: next(iter(old_layouts.values()))}
+
+    results: typing.Dict[str, typing.Any] = dict()
+    num_errors = 0
+    for name in sorted(old_layouts.keys() | new_layouts.keys()):
+        if name not in new_layouts:
+            results[name] = "removed"
+            continue
+        if name not in old_layouts:
+            results[name] = "added"
+            continue
+        try:
+            changes = diff_layouts(old_layouts[name](), new_layouts[name]())
+        except Exception as e:
+            sys.stderr.write(f"error: {name}: {e}\n")
+            num_errors += 1
+            continue
+        if changes:
+            results[name] = changes
+
+    if args.json:
+        print(json.dumps({name: r if isinstance(r, str) else [c.to_json() for c in r]
+                          for name, r in results.items()}, indent=2))
+    else:
+        for name, r in results.items():
+            if isinstance(r, str):
+                print(f"{'+' if r == 'added' else '-'} {name}")
+                continue
+            print(f"M {name}")
+            for change in r:
+                print(f"    {change}")
+
+    if num_errors:
+        sys.exit(2)
+    if results:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from collections import OrderedDict
+import json
+from pathlib import Path
+import struct
+import typing
+
+from jktool.layout import Anim, AnimEntry, Pane, Widget, WidgetType
+from jktool.util import content_hash
+
+_NUL_CHAR = b'\x00'
+_Header = struct.Struct("<4sHHHHHHHHIII")
+# Record headers, for tools that read layouts without decoding them
+PaneHeader = struct.Struct("<HH")
+AnimHeader = struct.Struct("<HHI")
+AnimEntryHeader = struct.Struct("<HBBHHI")
+_KEYFRAME_SIZE = 0xC
+WIDGETS_OFFSET = _Header.size
+WIDGET_SIZE = 0x44
+WidgetHeader = struct.Struct("<IHH")
+_MAX_CACHED_INDICES = 256
+# Stored in cached indices. Bump it whenever the fields of LayoutIndex change.
+_CACHE_VERSION = 1
+
+
+class LayoutIndex:
+    """Skip index over the variable-length records of an MFL layout.
+
+    Anims and anim entries do not have a fixed size, so reaching anim N normally requires
+    parsing every anim before it. The index records where each anim and entry starts
+    by reading only their small headers, which allows decoding a single anim by name.
+    """
+
+    def __init__(self, data: typing.Union[bytes, memoryview]) -> None:
+        mv = memoryview(data)
+        (magic, _, _, _, num_widgets, num_main_widgets, num_panes, num_players, num_anims,
+         self.panes_offset, self.anims_offset, self.names_offset) = _Header.unpack_from(mv, 0)
+        if magic != b'MFL ':
+            raise ValueError("Invalid magic: %s (expected 'MFL ')" % magic)
+
+        self.pane_offsets: typing.List[int] = []
+        offset = self.panes_offset
+        for _ in range(num_panes):
+            self.pane_offsets.append(offset)
+            _, size = PaneHeader.unpack_from(mv, offset)
+            offset += PaneHeader.size + size
+
+        self.anim_offsets: typing.List[int] = []
+        self.anim_start_frames: typing.List[int] = []
+        self.entry_offsets: typing.List[typing.List[int]] = []
+        offset = self.anims_offset
+        for _ in range(num_anims):
+            num_entries, _, start_frame = AnimHeader.unpack_from(mv, offset)
+            self.anim_offsets.append(offset)
+            self.anim_start_frames.append(start_frame)
+            offset += AnimHeader.size
+            entries: typing.List[int] = []
+            for _ in range(num_entries):
+                entries.append(offset)
+                _, _, _, num_keyframes, flags, _ = AnimEntryHeader.unpack_from(mv, offset)
+                offset += AnimEntryHeader.size
+                if flags & 3 == 0:
+                    offset += _KEYFRAME_SIZE * num_keyframes
+                else:
+                    offset += 4 * (start_frame + 1)
+            self.entry_offsets.append(entries)
+        if offset != self.names_offset:
+            raise ValueError(f"Anim data ends at 0x{offset:x} but names start at 0x{self.names_offset:x}")
+
+        num_names = 1 + num_main_widgets + num_panes + num_widgets + num_players + num_anims
+        names = [x.decode('utf-8') for x in bytes(mv[self.names_offset:]).split(_NUL_CHAR, num_names)[:num_names]]
+        self.name: str = names[0]
+        pos = 1
+        self.main_widgets_names = names[pos:pos + num_main_widgets]
+        pos += num_main_widgets
+        self.panes_names = names[pos:pos + num_panes]
+        pos += num_panes
+        self.widgets_names = names[pos:pos + num_widgets]
+        pos += num_widgets
+        self.players_names = names[pos:pos + num_players]
+        pos += num_players
+        self.anims_names = names[pos:pos + num_anims]
+
+    def parse_widgets(self, data: typing.Union[bytes, memoryview]):
+        """Decodes the flat widget list without touching panes or anims."""
+        num_widgets = len(self.widgets_names)
+        end = WIDGETS_OFFSET + WIDGET_SIZE * num_widgets
+        return Widget[num_widgets].parse(memoryview(data)[WIDGETS_OFFSET:end])
+
+    def get_widget_range(self, idx: int) -> typing.Tuple[int, int]:
+        start = WIDGETS_OFFSET + WIDGET_SIZE * idx
+        return start, start + WIDGET_SIZE
+
+    def parse_widget(self, data: typing.Union[bytes, memoryview], idx: int):
+        start, end = self.get_widget_range(idx)
+        return Widget.parse(memoryview(data)[start:end], _index=idx)
+
+    def parse_pane(self, data: typing.Union[bytes, memoryview], idx: int):
+        start = self.pane_offsets[idx]
+        _, size = PaneHeader.unpack_from(data, start)
+        return Pane.parse(memoryview(data)[start:start + PaneHeader.size + size])
+
+    def get_widget_child_counts(self, data: typing.Union[bytes, memoryview]) -> typing.List[int]:
+        """Reads the number of children of every widget without decoding the widgets."""
+        counts: typing.List[int] = []
+        for i in range(len(self.widgets_names)):
+            flags, object_idx, num_child_widgets = WidgetHeader.unpack_from(data, WIDGETS_OFFSET + WIDGET_SIZE * i)
+            widget_type = (flags >> 4) & 3
+            if widget_type == WidgetType.Layout:
+                counts.append(num_child_widgets)
+            elif widget_type == WidgetType.Group:
+                counts.append(object_idx)
+            else:
+                counts.append(0)
+        return counts
+
+    def get_pane_range(self, idx: int) -> typing.Tuple[int, int]:
+        end = self.pane_offsets[idx + 1] if idx + 1 < len(self.pane_offsets) else self.anims_offset
+        return self.pane_offsets[idx], end
+
+    def get_anim_idx(self, name: str) -> int:
+        try:
+            return self.anims_names.index(name)
+        except ValueError:
+            raise KeyError(f"No such anim: {name}") from None
+
+    def get_anim_range(self, idx: int) -> typing.Tuple[int, int]:
+        end = self.anim_offsets[idx + 1] if idx + 1 < len(self.anim_offsets) else self.names_offset
+        return self.anim_offsets[idx], end
+
+    def get_entry_range(self, anim_idx: int, entry_idx: int) -> typing.Tuple[int, int]:
+        entries = self.entry_offsets[anim_idx]
+        if entry_idx + 1 < len(entries):
+            return entries[entry_idx], entries[entry_idx + 1]
+        return entries[entry_idx], self.get_anim_range(anim_idx)[1]
+
+    def parse_anim(self, data: typing.Union[bytes, memoryview], name: str):
+        """Decodes a single anim without touching any of the other anims."""
+        start, end = self.get_anim_range(self.get_anim_idx(name))
+        return Anim.parse(memoryview(data)[start:end])
+
+    def parse_anim_entry(self, data: typing.Union[bytes, memoryview], anim_name: str, entry_idx: int):
+        return self.parse_anim_entry_at(data, self.get_anim_idx(anim_name), entry_idx)
+
+    def parse_anim_entry_at(self, data: typing.Union[bytes, memoryview], anim_idx: int, entry_idx: int):
+        """Like parse_anim_entry, but by anim index (anim names are not necessarily unique)."""
+        start, end = self.get_entry_range(anim_idx, entry_idx)
+        return AnimEntry.parse(memoryview(data)[start:end], startFrame=self.anim_start_frames[anim_idx])
+
+    def to_dict(self) -> dict:
+        return {"version": _CACHE_VERSION, **self.__dict__}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'LayoutIndex':
+        """Raises ValueError if d was not written by to_dict of this version."""
+        if not isinstance(d, dict) or d.get("version") != _CACHE_VERSION:
+            raise ValueError("Unsupported layout index version")
+        index = cls.__new__(cls)
+        index.__dict__.update((k, v) for k, v in d.items() if k != "version")
+        return index
+
+
+_cache: 'OrderedDict[str, LayoutIndex]' = OrderedDict()
+
+
+def get_layout_index(data: typing.Union[bytes, memoryview], cache_dir: typing.Optional[Path] = None) -> LayoutIndex:
+    """Returns the skip index for a layout, reusing a cached one if the contents were seen before.
+
+    Indices are kept in memory and, if cache_dir is given, stored on disk keyed by content hash.
+    """
+    key = content_hash(data)
+    index = _cache.get(key)
+    if index is not None:
+        _cache.move_to_end(key)
+        return index
+
+    cache_path = cache_dir / f"{key}.json" if cache_dir else None
+    if cache_path and cache_path.is_file():
+        try:
+            index = LayoutIndex.from_dict(json.loads(cache_path.read_text()))
+        except (OSError, ValueError):
+            # Written by another version or corrupt: treated as a miss and overwritten.
+            index = None
+    if index is None:
+        index = LayoutIndex(data)
+        if cache_path:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps(index.to_dict()))
+
+    _cache[key] = index
+    if len(_cache) > _MAX_CACHED_INDICES:
+        _cache.popitem(last=False)
+    return index
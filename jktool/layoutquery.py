@@ -0,0 +1,410 @@
+"""Queries over all layouts in a directory tree, including layouts stored in archives.
+
+Facts about every layout (panes, widgets and anim entries) are stored in a SQLite database,
+so queries do not need to read any layout. Facts are extracted from the record headers
+located by LayoutIndex, without decoding anything else, and refreshing the database only
+rescans layouts and archives whose mtime or size changed:
+
+    glytquery index romfs/
+    glytquery panes --type Text --msg-id 1234
+    glytquery anims --widget W_logo
+    glytquery layouts --min-keyframes 1000
+"""
+import argparse
+import os
+from pathlib import Path
+import struct
+import sys
+import typing
+
+from jktool import fileindex, gar
+from jktool.fileindex import RefreshStats
+from jktool.layout import AnimEntryType, PaneType, WidgetType, WidgetValueType
+
+DEFAULT_INDEX_NAME = ".layout-index.sqlite"
+# Bumped when the extracted facts change, so that existing indexes are rebuilt.
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS layouts (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE,
+    member TEXT NOT NULL,
+    name TEXT NOT NULL,
+    num_widgets INTEGER NOT NULL,
+    num_panes INTEGER NOT NULL,
+    num_anims INTEGER NOT NULL,
+    num_keyframes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS panes (
+    layout_id INTEGER NOT NULL REFERENCES layouts(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    msg_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS widgets (
+    layout_id INTEGER NOT NULL REFERENCES layouts(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    pane TEXT
+);
+CREATE TABLE IF NOT EXISTS anim_entries (
+    layout_id INTEGER NOT NULL REFERENCES layouts(id) ON DELETE CASCADE,
+    anim TEXT NOT NULL,
+    widget TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    type TEXT NOT NULL,
+    num_keyframes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS layouts_source ON layouts(source_id);
+CREATE INDEX IF NOT EXISTS panes_layout ON panes(layout_id);
+CREATE INDEX IF NOT EXISTS panes_msg_id ON panes(msg_id);
+CREATE INDEX IF NOT EXISTS panes_name ON panes(name);
+CREATE INDEX IF NOT EXISTS widgets_layout ON widgets(layout_id);
+CREATE INDEX IF NOT EXISTS widgets_name ON widgets(name);
+CREATE INDEX IF NOT EXISTS anim_entries_layout ON anim_entries(layout_id);
+CREATE INDEX IF NOT EXISTS anim_entries_widget ON anim_entries(widget);
+CREATE INDEX IF NOT EXISTS anim_entries_anim ON anim_entries(anim);
+"""
+
+_PaneType = struct.Struct("<H")
+# Pane header (4 bytes), then translate, width and height
+_TEXT_MSG_ID_OFFSET = 4 + 0x14
+_U32 = struct.Struct("<I")
+
+
+class LayoutMatch(typing.NamedTuple):
+    # Layout path relative to the index, or archive.gar:member for layouts in archives
+    path: str
+    name: str
+    num_widgets: int
+    num_panes: int
+    num_anims: int
+    num_keyframes: int
+
+
+class PaneMatch(typing.NamedTuple):
+    path: str
+    name: str
+    type: str
+    # Only set for Text panes
+    msg_id: typing.Optional[int]
+
+
+class WidgetMatch(typing.NamedTuple):
+    path: str
+    name: str
+    type: str
+    # Only set for Pane widgets
+    pane: typing.Optional[str]
+
+
+class AnimEntryMatch(typing.NamedTuple):
+    path: str
+    anim: str
+    widget: str
+    value_type: str
+    type: str
+    # 0 for Set and Add entries, which have no keyframes
+    num_keyframes: int
+
+
+class _LayoutFacts(typing.NamedTuple):
+    member: str
+    name: str
+    num_widgets: int
+    num_panes: int
+    num_anims: int
+    num_keyframes: int
+    # (name, type, msg_id)
+    panes: typing.List[typing.Tuple[str, str, typing.Optional[int]]]
+    # (name, type, pane)
+    widgets: typing.List[typing.Tuple[str, str, typing.Optional[str]]]
+    # (anim, widget, value_type, type, num_keyframes)
+    anim_entries: typing.List[typing.Tuple[str, str, str, str, int]]
+
+
+def _enum_name(enum: typing.Type, value: int) -> str:
+    try:
+        return enum(value).name
+    except ValueError:
+        return str(value)
+
+
+def scan_layout(data: typing.Union[bytes, memoryview], member: str = "") -> _LayoutFacts:
+    """Extracts the facts that are stored in the index from a layout, reading only record headers."""
+    # Not needed for queries: the layout schemas (and construct) are only loaded for indexing.
+    from jktool.layoutindex import AnimEntryHeader, LayoutIndex, WidgetHeader
+
+    index = LayoutIndex(data)
+    panes: typing.List[typing.Tuple[str, str, typing.Optional[int]]] = []
+    for name, offset in zip(index.panes_names, index.pane_offsets):
+        pane_type = _PaneType.unpack_from(data, offset)[0]
+        msg_id = _U32.unpack_from(data, offset + _TEXT_MSG_ID_OFFSET)[0] if pane_type == PaneType.Text else None
+        panes.append((name, _enum_name(PaneType, pane_type), msg_id))
+
+    widgets: typing.List[typing.Tuple[str, str, typing.Optional[str]]] = []
+    for i, name in enumerate(index.widgets_names):
+        flags, object_idx, _ = WidgetHeader.unpack_from(data, index.get_widget_range(i)[0])
+        widget_type = (flags >> 4) & 3
+        pane = None
+        if widget_type == WidgetType.Pane and object_idx < len(index.panes_names):
+            pane = index.panes_names[object_idx]
+        widgets.append((name, WidgetType(widget_type).name, pane))
+
+    anim_entries: typing.List[typing.Tuple[str, str, str, str, int]] = []
+    for anim, entry_offsets in zip(index.anims_names, index.entry_offsets):
+        for offset in entry_offsets:
+            widget_idx, value_type, _, num_keyframes, flags, _ = AnimEntryHeader.unpack_from(data, offset)
+            entry_type = flags & 3
+            if entry_type != AnimEntryType.Interpolate:
+                # Other entries store one value per frame, not keyframes.
+                num_keyframes = 0
+            widget = index.widgets_names[widget_idx] if widget_idx < len(index.widgets_names) else str(widget_idx)
+            anim_entries.append((anim, widget, _enum_name(WidgetValueType, value_type),
+                                 AnimEntryType(entry_type).name, num_keyframes))
+
+    return _LayoutFacts(member, index.name, len(widgets), len(panes), len(index.anims_names),
+                        sum(entry[4] for entry in anim_entries), panes, widgets, anim_entries)
+
+
+def _scan_source(root: Path, rel_path: str) -> fileindex.ScanResult:
+    """Returns the facts of a layout, or of every layout in an archive."""
+    path = root / rel_path
+    layouts: typing.List[_LayoutFacts] = []
+    errors: typing.List[typing.Tuple[str, str]] = []
+    try:
+        st = path.stat()
+        if path.suffix == ".gar":
+            for name, file in gar.open_gar(path).get_files().items():
+                if not name.endswith(".mfl"):
+                    continue
+                try:
+                    layouts.append(scan_layout(file.data, name))
+                except Exception as e:
+                    errors.append((f"{rel_path}:{name}", fileindex.format_error(e)))
+        else:
+            layouts.append(scan_layout(path.read_bytes()))
+    except Exception as e:
+        return fileindex.scan_failed(rel_path, e)
+    return fileindex.ScanResult(rel_path, st.st_mtime_ns, st.st_size, layouts, errors)
+
+
+def _name_condition(column: str, pattern: str) -> str:
+    return f"{column} {'GLOB' if fileindex.has_wildcards(pattern) else '='} ?"
+
+
+_PATH = "CASE layouts.member WHEN '' THEN sources.path ELSE sources.path || ':' || layouts.member END"
+
+
+class LayoutQuery:
+    """Index of the layouts (*.mfl, also inside *.gar) in a directory tree.
+
+    The indexed directory is stored in the database when root is specified. By default, it is
+    the one the index was created for, or else the directory that contains the database.
+    """
+
+    def __init__(self, db_path: Path, root: typing.Optional[Path] = None) -> None:
+        self.db_path = db_path
+        self._db = fileindex.open_db(db_path, _SCHEMA, "sources", _SCHEMA_VERSION)
+        self.root = fileindex.get_root(self._db, db_path, root)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "LayoutQuery":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def refresh(self, num_workers: typing.Optional[int] = None) -> RefreshStats:
+        """Rescans layouts and archives that were added or modified since the last refresh."""
+        return fileindex.refresh(self._db, "sources", self.root, (".mfl", ".gar"), _scan_source, self._add_source,
+                                 num_workers)
+
+    def _add_source(self, source_id: int, layouts: typing.List[_LayoutFacts]) -> None:
+        for facts in layouts:
+            layout_id = self._db.execute(
+                "INSERT INTO layouts (source_id, member, name, num_widgets, num_panes, num_anims, num_keyframes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source_id, *facts[:6])).lastrowid
+            self._db.executemany("INSERT INTO panes (layout_id, name, type, msg_id) VALUES (?, ?, ?, ?)",
+                                 ((layout_id, *pane) for pane in facts.panes))
+            self._db.executemany("INSERT INTO widgets (layout_id, name, type, pane) VALUES (?, ?, ?, ?)",
+                                 ((layout_id, *widget) for widget in facts.widgets))
+            self._db.executemany(
+                "INSERT INTO anim_entries (layout_id, anim, widget, value_type, type, num_keyframes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((layout_id, *entry) for entry in facts.anim_entries))
+
+    def find_layouts(self, name: typing.Optional[str] = None,
+                     min_keyframes: typing.Optional[int] = None) -> typing.List[LayoutMatch]:
+        """Finds layouts by name (glob wildcards are supported) or total number of keyframes (inclusive).
+
+        Like every other query, conditions are combined with AND, and name patterns are only
+        treated as globs if they contain wildcards.
+        """
+        conditions: typing.List[typing.Tuple[str, typing.Any]] = []
+        if name is not None:
+            conditions.append((_name_condition("layouts.name", name), name))
+        if min_keyframes is not None:
+            conditions.append(("layouts.num_keyframes >= ?", min_keyframes))
+        return [LayoutMatch(*row) for row in self._query(
+            "layouts.name, layouts.num_widgets, layouts.num_panes, layouts.num_anims, layouts.num_keyframes",
+            "", conditions, "path")]
+
+    def find_panes(self, name: typing.Optional[str] = None, type: typing.Optional[str] = None,
+                   msg_id: typing.Optional[int] = None) -> typing.List[PaneMatch]:
+        conditions: typing.List[typing.Tuple[str, typing.Any]] = []
+        if name is not None:
+            conditions.append((_name_condition("panes.name", name), name))
+        if type is not None:
+            conditions.append(("panes.type = ?", type))
+        if msg_id is not None:
+            conditions.append(("panes.msg_id = ?", msg_id))
+        return [PaneMatch(*row) for row in self._query(
+            "panes.name, panes.type, panes.msg_id", "JOIN panes ON panes.layout_id = layouts.id",
+            conditions, "path, panes.rowid")]
+
+    def find_widgets(self, name: typing.Optional[str] = None, type: typing.Optional[str] = None,
+                     pane: typing.Optional[str] = None) -> typing.List[WidgetMatch]:
+        conditions: typing.List[typing.Tuple[str, typing.Any]] = []
+        if name is not None:
+            conditions.append((_name_condition("widgets.name", name), name))
+        if type is not None:
+            conditions.append(("widgets.type = ?", type))
+        if pane is not None:
+            conditions.append((_name_condition("widgets.pane", pane), pane))
+        return [WidgetMatch(*row) for row in self._query(
+            "widgets.name, widgets.type, widgets.pane", "JOIN widgets ON widgets.layout_id = layouts.id",
+            conditions, "path, widgets.rowid")]
+
+    def find_anim_entries(self, widget: typing.Optional[str] = None, anim: typing.Optional[str] = None,
+                          value_type: typing.Optional[str] = None) -> typing.List[AnimEntryMatch]:
+        conditions: typing.List[typing.Tuple[str, typing.Any]] = []
+        if widget is not None:
+            conditions.append((_name_condition("anim_entries.widget", widget), widget))
+        if anim is not None:
+            conditions.append((_name_condition("anim_entries.anim", anim), anim))
+        if value_type is not None:
+            conditions.append(("anim_entries.value_type = ?", value_type))
+        return [AnimEntryMatch(*row) for row in self._query(
+            "anim_entries.anim, anim_entries.widget, anim_entries.value_type, anim_entries.type, "
+            "anim_entries.num_keyframes", "JOIN anim_entries ON anim_entries.layout_id = layouts.id",
+            conditions, "path, anim_entries.rowid")]
+
+    def _query(self, columns: str, join: str, conditions: typing.Sequence[typing.Tuple[str, typing.Any]],
+               order: str) -> typing.List[tuple]:
+        where = " AND ".join(condition for condition, _ in conditions)
+        return self._db.execute(
+            f"SELECT {_PATH} AS path, {columns} FROM layouts JOIN sources ON sources.id = layouts.source_id "
+            f"{join} {'WHERE ' + where if where else ''} ORDER BY {order}",
+            [param for _, param in conditions]).fetchall()
+
+
+def find_index(start: Path) -> typing.Optional[Path]:
+    """Looks for an index in start and its parent directories."""
+    return fileindex.find_index(start, DEFAULT_INDEX_NAME)
+
+
+def _open_index(args) -> LayoutQuery:
+    index_path = Path(args.index) if args.index else find_index(Path.cwd())
+    if index_path is None or not index_path.is_file():
+        sys.stderr.write(f'error: no index found (create one with "glytquery index DIR", '
+                         f"which writes DIR/{DEFAULT_INDEX_NAME})\n")
+        sys.exit(1)
+    return LayoutQuery(index_path)
+
+
+def _print_results(index: LayoutQuery, results: typing.Sequence[tuple], describe) -> None:
+    for result in results:
+        print(f"{os.path.relpath(index.root / result[0])}: {describe(result)}")
+    if not results:
+        sys.exit(1)
+
+
+def _cmd_index(args) -> None:
+    root = Path(args.root)
+    if not root.is_dir():
+        sys.stderr.write(f"error: {root} is not a directory\n")
+        sys.exit(1)
+    with LayoutQuery(Path(args.index) if args.index else root / DEFAULT_INDEX_NAME, root) as index:
+        stats = index.refresh(args.jobs)
+    for path, error in stats.errors:
+        sys.stderr.write(f"error: {path}: {error}\n")
+    print(f"{stats.scanned} scanned, {stats.unchanged} unchanged, {stats.removed} removed")
+
+
+def _cmd_layouts(args) -> None:
+    with _open_index(args) as index:
+        _print_results(index, index.find_layouts(args.name, args.min_keyframes),
+                       lambda r: f"{r.name} ({r.num_widgets} widgets, {r.num_panes} panes, "
+                                 f"{r.num_anims} anims, {r.num_keyframes} keyframes)")
+
+
+def _cmd_panes(args) -> None:
+    with _open_index(args) as index:
+        _print_results(index, index.find_panes(args.name, args.type, args.msg_id),
+                       lambda r: f"{r.name} ({r.type}{'' if r.msg_id is None else f', msgId {r.msg_id}'})")
+
+
+def _cmd_widgets(args) -> None:
+    with _open_index(args) as index:
+        _print_results(index, index.find_widgets(args.name, args.type, args.pane),
+                       lambda r: f"{r.name} ({r.type}{'' if r.pane is None else f', pane {r.pane}'})")
+
+
+def _cmd_anims(args) -> None:
+    with _open_index(args) as index:
+        _print_results(index, index.find_anim_entries(args.widget, args.anim, args.value_type),
+                       lambda r: f"{r.anim}: {r.widget} {r.value_type} ({r.type}, {r.num_keyframes} keyframes)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the layouts in a directory tree (and in its archives).")
+    parser.add_argument("--index", help="Index file (default: look for one in the current directory and its parents)")
+    subparsers = parser.add_subparsers(dest="command", help="Command")
+    subparsers.required = True
+
+    i_parser = subparsers.add_parser("index", description="Index the layouts in a directory tree "
+                                                          "(only changed layouts and archives are rescanned)")
+    i_parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes")
+    i_parser.add_argument("root", nargs="?", default=".", help="Directory to index (default: current directory)")
+    i_parser.set_defaults(func=_cmd_index)
+
+    l_parser = subparsers.add_parser("layouts", description="Find layouts")
+    l_parser.add_argument("--name", help="Layout name; may contain glob wildcards")
+    l_parser.add_argument("--min-keyframes", type=int, help="Minimum total number of keyframes")
+    l_parser.set_defaults(func=_cmd_layouts)
+
+    p_parser = subparsers.add_parser("panes", description="Find panes")
+    p_parser.add_argument("--name", help="Pane name; may contain glob wildcards")
+    p_parser.add_argument("--type", choices=[t.name for t in PaneType], help="Pane type")
+    p_parser.add_argument("--msg-id", type=lambda n: int(n, 0), help="Message ID (Text panes)")
+    p_parser.set_defaults(func=_cmd_panes)
+
+    w_parser = subparsers.add_parser("widgets", description="Find widgets")
+    w_parser.add_argument("--name", help="Widget name; may contain glob wildcards")
+    w_parser.add_argument("--type", choices=[t.name for t in WidgetType], help="Widget type")
+    w_parser.add_argument("--pane", help="Name of the pane that is used by the widget; may contain glob wildcards")
+    w_parser.set_defaults(func=_cmd_widgets)
+
+    a_parser = subparsers.add_parser("anims", description="Find anim entries")
+    a_parser.add_argument("--widget", help="Name of the animated widget; may contain glob wildcards")
+    a_parser.add_argument("--anim", help="Anim name; may contain glob wildcards")
+    a_parser.add_argument("--value-type", choices=[t.name for t in WidgetValueType], help="Animated value")
+    a_parser.set_defaults(func=_cmd_anims)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,34 @@
 import argparse
-import construct as ct
+from collections import defaultdict
+import glob
+import io
+import itertools
 from pathlib import Path
+import struct
 import sys
-import yaml
-import enum
+import typing
 
-from jktool.layout import *
+from jktool import watch
+from jktool import layout as schemas
+from jktool.buildcache import BuildCache
+from jktool.instrument import phase, run_instrumented
+from jktool.layout import AnimEntryType, WidgetType
+from jktool.util import lazy_import
+from jktool.widgettree import WidgetTree, linearize
+
+# Only needed for conversions: not importing these up front keeps startup fast.
+gar = lazy_import("jktool.gar")
+archivecache = lazy_import("jktool.archivecache")
+yaml = lazy_import("yaml")
+yamlemit = lazy_import("jktool.yamlemit")
+layoutindex = lazy_import("jktool.layoutindex")
+
+
+def preload() -> None:
+    """Loads everything that conversions need right away (for long-running processes)."""
+    for module, attr in ((yaml, "CSafeLoader"), (yamlemit, "emit"), (layoutindex, "get_layout_index"),
+                         (schemas, "Layout")):
+        getattr(module, attr)
 
 
 def build_layout(layout: dict) -> bytes:
@@ -22,7 +45,7 @@ def build_layout(layout: dict) -> bytes:
     layout["widgets"] = []
     layout["widgetsNames"] = []
 
-    def build_widget_list(widget: dict) -> None:
+    for widget in linearize(layout["rootWidget"]):
         if widget["id"] in widget_ids_to_idx_map:
             raise ValueError(f"Duplicate widget ID: {widget['id']}")
         widget_ids_to_idx_map[widget["id"]] = len(layout["widgets"])
@@ -43,93 +66,366 @@ def build_layout(layout: dict) -> bytes:
         elif widget["type"] == WidgetType.Group:
             widget["objectIdx"] = len(widget["widgets"])
 
-        for child in widget["widgets"]:
-            build_widget_list(child)
+    for widget in layout["widgets"]:
         del widget["widgets"]
 
-    build_widget_list(layout["rootWidget"])
-
     layout["animsNames"] = []
     for anim in layout["anims"]:
         layout["animsNames"].append(anim["name"])
         for entry in anim["entries"]:
             entry["widgetIdx"] = widget_ids_to_idx_map[entry["widget"]]
+            if isinstance(entry["data"], dict):
+                entry["data"] = expand_keyframes(entry["data"])
+
+    return schemas.Layout.build(layout)
+
+
+def compact_keyframes(keyframes) -> dict:
+    """Converts a list of keyframes to parallel frame/flags/value lists (for compact YAML output)."""
+    return {
+        "frame": [k.frame for k in keyframes],
+        "flags": [k.flags for k in keyframes],
+        "value": yamlemit.Float32List(k.value for k in keyframes),
+    }
 
-    return Layout.build(layout)
+
+def expand_keyframes(columns: dict) -> list:
+    """Inverse of compact_keyframes."""
+    if not len(columns["frame"]) == len(columns["flags"]) == len(columns["value"]):
+        raise ValueError("Keyframe columns have different lengths")
+    return [{"frame": frame, "flags": flags, "value": value}
+            for frame, flags, value in zip(columns["frame"], columns["flags"], columns["value"])]
 
 
 def build_project(project: dict) -> bytes:
     project["packages"] = [x["name"] for x in project["packages"]]
     project["layouts"] = [x["name"] for x in project["layouts"]]
-    return Project.build(project)
-
-
-def remove_io(v):
-    if isinstance(v, ct.core.EnumIntegerString) or isinstance(v, enum.IntEnum):
-        return int(v)
-
-    if isinstance(v, dict):
-        if "_io" in v:
-            del v["_io"]
-        d = dict()
-        # Put these keys first
-        for key in ("name", "id", "widget"):
-            if key in v:
-                d[key] = v[key]
-        d.update({k: remove_io(vv) for k, vv in v.items() if not k.startswith("_")})
-        return d
-    elif isinstance(v, list):
-        return [remove_io(x) for x in v]
-    else:
-        return v
+    return schemas.Project.build(project)
+
+
+def get_file_type(path: Path) -> str:
+    return path.suffixes[0][1:]
+
+
+def build_binary(data: dict, type: str) -> bytes:
+    if type == "mfl":
+        return build_layout(data)
+    if type == "mfpk":
+        return schemas.Package.build(data)
+    if type == "mfpj":
+        return build_project(data)
+    raise ValueError("unknown type: " + type)
 
 
-def dump(data) -> None:
-    parsed = remove_io(data)
-    yaml.dump(parsed, stream=sys.stdout, Dumper=yaml.CSafeDumper,
-              sort_keys=False, default_flow_style=None)
+def build_source(source: bytes, type: str, cache: typing.Optional[BuildCache] = None) -> bytes:
+    """Builds a binary from YAML source, reusing a previously built binary if possible."""
+    key = cache.get_key(source, type) if cache else ""
+    if cache:
+        built = cache.get(key)
+        if built is not None:
+            return built
+    with phase("load"):
+        data = yaml.load(source, Loader=yaml.CSafeLoader)
+    with phase("build"):
+        built = build_binary(data, type)
+    if cache:
+        cache.put(key, built)
+    return built
 
 
-def parse_widget_tree(layout, idx, parent) -> int:
-    next_idx = idx + 1
-    widget = layout.widgets[idx]
-    name = layout.widgetsNames[idx]
+class ConversionJob(typing.NamedTuple):
+    src: Path
+    dest: Path
+    type: str
+    to_binary: bool
+    # If set, src (or dest) is an archive and this is the name of the file inside it.
+    src_member: str = ""
+    dest_member: str = ""
 
-    widget["name"] = name
-    widget["id"] = f'{widget["name"]}-{widget["widgetIdx"]}'
-    del widget["widgetIdx"]
-    widget["widgets"] = []
-    if parent:
-        parent["widgets"].append(widget)
 
-    if widget.type == WidgetType.Layout:
-        for _ in range(widget.numChildWidgets):
-            next_idx = parse_widget_tree(layout, next_idx, widget)
-    elif widget.type == WidgetType.Pane:
-        widget["pane"] = layout.panes[widget.objectIdx]["name"]
-        del widget["objectIdx"]
-    elif widget.type == WidgetType.Group:
-        for _ in range(widget.objectIdx):
-            next_idx = parse_widget_tree(layout, next_idx, widget)
-        del widget["objectIdx"]
+class ConversionResult(typing.NamedTuple):
+    job: ConversionJob
+    error: str = ""
+    # Build cache key of the source (only for YAML -> binary conversions with a cache)
+    key: str = ""
+    # Built binary, for jobs that write into an archive
+    data: bytes = b""
 
-    return next_idx
 
+_BINARY_TYPES = ("mfl", "mfpk", "mfpj")
+_ARCHIVE_SEPARATOR = ".gar:"
 
-def dump_layout(layout) -> None:
+
+def split_archive_spec(spec: str) -> typing.Tuple[typing.Optional[Path], str]:
+    """Splits "archive.gar:path/inside" into the archive path and the member name.
+
+    Returns (None, spec) if spec does not refer to an archive, and an empty member name
+    for a plain archive path.
+    """
+    idx = spec.find(_ARCHIVE_SEPARATOR)
+    if idx != -1:
+        return Path(spec[:idx + len(_ARCHIVE_SEPARATOR) - 1]), spec[idx + len(_ARCHIVE_SEPARATOR):]
+    if spec.endswith(".gar"):
+        return Path(spec), ""
+    return None, spec
+
+
+def open_archive(path: Path) -> "gar.Gar":
+    """Opens an archive for reading, reusing an already opened one if the file did not change."""
+    return archivecache.open_archive(path)
+
+
+def read_source(path: Path, member: str = "") -> typing.Union[bytes, memoryview]:
+    """Reads a file, or a file inside an archive if member is set (without copying it)."""
+    if not member:
+        return path.read_bytes()
+    try:
+        return open_archive(path).get_files()[member].data
+    except KeyError:
+        raise FileNotFoundError(f"{path}: no such file in archive: {member}") from None
+
+
+def make_conversion_job(path: Path, rel_path: Path, dest_dir: Path) -> ConversionJob:
+    if path.suffix == ".yml":
+        return ConversionJob(path, dest_dir / rel_path.with_suffix(""), get_file_type(path), True)
+    return ConversionJob(path, dest_dir / rel_path.with_name(rel_path.name + ".yml"), get_file_type(path), False)
+
+
+def _is_convertible(path: Path) -> bool:
+    return bool(path.suffixes) and get_file_type(path) in _BINARY_TYPES
+
+
+def _collect_paths(spec: str) -> typing.Tuple[Path, typing.List[Path], typing.Optional[Path]]:
+    """Returns the base directory, the matched paths and the archive (if spec refers to one)."""
+    archive_path, member = split_archive_spec(spec)
+    if archive_path:
+        if member:
+            return Path(), [Path(member)], archive_path
+        names = open_archive(archive_path).get_files().keys()
+        return Path(), [Path(name) for name in names], archive_path
+
+    if any(c in spec for c in "*?["):
+        base = Path(spec)
+        while any(c in base.name for c in "*?[") or base.name == "**":
+            base = base.parent
+        return base, [Path(p) for p in sorted(glob.glob(spec, recursive=True))], None
+    if Path(spec).is_dir():
+        return Path(spec), sorted(p for p in Path(spec).rglob("*") if p.is_file()), None
+    return Path(spec).parent, [Path(spec)], None
+
+
+def collect_conversion_jobs(inputs: typing.Iterable[str], dest_dir: typing.Optional[Path],
+                            to_binary: typing.Optional[bool] = None,
+                            into: typing.Optional[str] = None) -> typing.List[ConversionJob]:
+    """Expands files, directories, glob patterns and archives into conversion jobs.
+
+    Outputs mirror the input paths (relative to the directory, to the non-glob part of the
+    pattern or to the archive root) inside dest_dir, or are written next to their input if
+    dest_dir is None.
+
+    If into is set ("archive.gar" or "archive.gar:dir/" or "archive.gar:dir/name.mfl"),
+    built binaries are stored in that archive instead of being written as files.
+    If to_binary is set, only conversions in that direction are collected.
+    """
+    jobs: typing.List[ConversionJob] = []
+    for spec in inputs:
+        base, paths, archive_path = _collect_paths(spec)
+        for path in paths:
+            if not _is_convertible(path):
+                continue
+            if to_binary is not None and to_binary != (path.suffix == ".yml"):
+                continue
+            if archive_path:
+                # Files inside an archive go to a directory named after the archive by default.
+                root = dest_dir if dest_dir else archive_path.parent / archive_path.stem
+                job = make_conversion_job(path, path, Path() if into else root)
+                job = job._replace(src=archive_path, src_member=path.as_posix())
+            else:
+                root = dest_dir if dest_dir else base
+                job = make_conversion_job(path, path.relative_to(base), Path() if into else root)
+            jobs.append(job)
+
+    if into:
+        into_archive, into_member = split_archive_spec(into)
+        if not into_archive:
+            raise ValueError(f"{into} is not an archive")
+        if into_member and not into_member.endswith("/") and len(jobs) != 1:
+            raise ValueError("an archive member name can only be given for a single input")
+        into_jobs = []
+        for job in jobs:
+            if not job.to_binary:
+                raise ValueError(f"{job.src}: only binaries can be stored in an archive")
+            # job.dest is relative to the archive root here.
+            member = into_member if into_member and not into_member.endswith("/") else into_member + job.dest.as_posix()
+            into_jobs.append(job._replace(dest=into_archive, dest_member=member))
+        return into_jobs
+
+    srcs = {job.src.resolve() for job in jobs if not job.src_member}
+    for job in jobs:
+        if job.dest.resolve() in srcs:
+            raise ValueError(f"{job.src} would overwrite {job.dest}, which is also an input "
+                             "(specify a conversion direction)")
+    return jobs
+
+
+def run_conversion_job(job: ConversionJob, cache_dir: typing.Optional[Path] = None,
+                       compact: bool = False) -> ConversionResult:
+    # Outputs are written to a temporary file first so that failed conversions leave nothing behind.
+    tmp_dest = job.dest.with_name(job.dest.name + ".tmp")
+    try:
+        if job.to_binary:
+            cache = BuildCache(cache_dir) if cache_dir else None
+            with phase("read"):
+                source = bytes(read_source(job.src, job.src_member))
+            built = build_source(source, job.type, cache)
+            key = cache.get_key(source, job.type) if cache else ""
+            if job.dest_member:
+                return ConversionResult(job, key=key, data=built)
+            with phase("write"):
+                job.dest.parent.mkdir(parents=True, exist_ok=True)
+                tmp_dest.write_bytes(built)
+        else:
+            key = ""
+            with phase("read"):
+                data = read_source(job.src, job.src_member)
+            job.dest.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_dest.open("w") as stream:
+                dump_source(data, job.type, stream, compact)
+        tmp_dest.replace(job.dest)
+        return ConversionResult(job, key=key)
+    except Exception as e:
+        if tmp_dest.exists():
+            tmp_dest.unlink()
+        return ConversionResult(job, error=f"{e.__class__.__name__}: {e}")
+
+
+def write_into_archive(archive_path: Path, files: typing.Dict[str, bytes]) -> None:
+    """Adds or replaces files in an archive (which is created if it does not exist)."""
+    with phase("pack"):
+        if archive_path.exists():
+            writer = gar.GarWriter.from_gar(gar.Gar(archive_path.read_bytes()))
+        else:
+            writer = gar.GarWriter()
+        for name, data in files.items():
+            writer.files[name] = gar.GarWriter.File(name, data)
+        buf = io.BytesIO()
+        writer.write(buf)
+        tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+        tmp_path.write_bytes(buf.getvalue())
+        tmp_path.replace(archive_path)
+
+
+def run_conversion_jobs(jobs: typing.Sequence[ConversionJob], cache_dir: typing.Optional[Path] = None,
+                        compact: bool = False, num_workers: typing.Optional[int] = None,
+                        ) -> typing.Iterator[ConversionResult]:
+    """Runs conversion jobs, in parallel using a process pool if num_workers is not 1.
+
+    With a cache, YAML files whose output is already up-to-date are skipped. Results are
+    yielded as jobs complete; failures are reported in the result instead of being raised.
+    Binaries that go into archives are written once all jobs have completed.
+    """
+    cache = BuildCache(cache_dir) if cache_dir else None
+    if cache:
+        pending = []
+        for job in jobs:
+            if job.to_binary and not job.dest_member and cache.is_output_up_to_date(
+                    job.dest, cache.get_key(bytes(read_source(job.src, job.src_member)), job.type)):
+                continue
+            pending.append(job)
+        jobs = pending
+
+    import concurrent.futures
+    archive_files: typing.Dict[Path, typing.Dict[str, bytes]] = defaultdict(dict)
+    try:
+        results: typing.Iterable[ConversionResult]
+        if num_workers == 1 or len(jobs) <= 1:
+            results = (run_conversion_job(job, cache_dir, compact) for job in jobs)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+            futures = [executor.submit(run_conversion_job, job, cache_dir, compact) for job in jobs]
+            results = (future.result() for future in concurrent.futures.as_completed(futures))
+
+        try:
+            for result in results:
+                if result.job.dest_member and not result.error:
+                    archive_files[result.job.dest][result.job.dest_member] = result.data
+                elif cache and result.key:
+                    cache.record_output(result.job.dest, result.key)
+                yield result
+        finally:
+            if executor:
+                executor.shutdown()
+
+        for archive_path, files in archive_files.items():
+            write_into_archive(archive_path, files)
+    finally:
+        if cache:
+            cache.save()
+
+
+def build_directory(src_dir: Path, dest_dir: Path, cache_dir: typing.Optional[Path] = None,
+                    num_workers: typing.Optional[int] = None) -> typing.List[Path]:
+    """Builds every YAML file in src_dir to the same relative path in dest_dir (minus .yml).
+
+    With a cache, outputs whose source and tool version are unchanged are skipped entirely.
+    Returns the list of written files.
+    """
+    jobs = collect_conversion_jobs([str(src_dir)], dest_dir, to_binary=True)
+    written: typing.List[Path] = []
+    for result in run_conversion_jobs(jobs, cache_dir, num_workers=num_workers):
+        if result.error:
+            raise ValueError(f"{result.job.src}: {result.error}")
+        written.append(result.job.dest)
+    return sorted(written)
+
+
+def dump(data, stream: typing.Optional[typing.TextIO] = None) -> None:
+    with phase("emit"):
+        yamlemit.emit(yamlemit.iter_document_events(data), stream or sys.stdout)
+
+
+def parse_widget_tree(layout) -> WidgetTree:
+    tree = WidgetTree.from_widgets(layout.widgets)
+    for idx, widget in enumerate(layout.widgets):
+        widget["name"] = layout.widgetsNames[idx]
+        widget["id"] = f'{widget["name"]}-{widget["widgetIdx"]}'
+        del widget["widgetIdx"]
+        widget["widgets"] = []
+        parent = tree.parent[idx]
+        if parent >= 0:
+            layout.widgets[parent]["widgets"].append(widget)
+
+        if widget.type == WidgetType.Pane:
+            widget["pane"] = layout.panes[widget.objectIdx]["name"]
+            del widget["objectIdx"]
+        elif widget.type == WidgetType.Group:
+            del widget["objectIdx"]
+
+    return tree
+
+
+def fix_anim(anim, name: str, get_widget_id, compact: bool = False) -> None:
+    anim["name"] = name
+    del anim["numEntries"]
+    for entry in anim["entries"]:
+        entry["widget"] = get_widget_id(entry.widgetIdx)
+        del entry["widgetIdx"]
+        if compact and entry.type == AnimEntryType.Interpolate:
+            entry["data"] = compact_keyframes(entry["data"])
+        elif compact:
+            entry["data"] = yamlemit.Float32List(entry["data"])
+
+
+def dump_layout(layout, compact: bool = False) -> None:
     for pane, name in zip(layout.panes, layout.panesNames):
         pane["name"] = name
 
-    parse_widget_tree(layout, 0, None)
+    parse_widget_tree(layout)
     layout["rootWidget"] = layout.widgets[0]
 
     for anim, name in zip(layout.anims, layout.animsNames):
-        anim["name"] = name
-        del anim["numEntries"]
-        for entry in anim["entries"]:
-            widget = layout["widgets"][entry.widgetIdx]
-            entry["widget"] = widget["id"]
-            del entry["widgetIdx"]
+        fix_anim(anim, name, lambda idx: layout["widgets"][idx]["id"], compact)
 
     del layout["widgets"]
     del layout["widgetsNames"]
@@ -148,47 +444,255 @@ def dump_layout(layout) -> None:
     dump(layout)
 
 
-def dump_project(project) -> None:
+def _iter_widget_tree_event_chunks(data: bytes, index) -> typing.Iterator[typing.Iterable["yaml.Event"]]:
+    tree = WidgetTree(index.get_widget_child_counts(data))
+    close_widget_events = (yamlemit.SequenceEndEvent(), yamlemit.MappingEndEvent())
+    # Widgets whose children are still being emitted.
+    open_widgets: typing.List[int] = []
+    for idx in range(tree.subtree_end[0]):
+        while open_widgets and tree.subtree_end[open_widgets[-1]] <= idx:
+            open_widgets.pop()
+            yield close_widget_events
+
+        widget = index.parse_widget(data, idx)
+        widget["name"] = index.widgets_names[idx]
+        widget["id"] = f'{widget["name"]}-{widget["widgetIdx"]}'
+        del widget["widgetIdx"]
+        if widget.type == WidgetType.Pane:
+            widget["widgets"] = []
+            widget["pane"] = index.panes_names[widget.objectIdx]
+            del widget["objectIdx"]
+        elif widget.type == WidgetType.Group:
+            del widget["objectIdx"]
+
+        if tree.first_child[idx] < 0:
+            widget.setdefault("widgets", [])
+            yield yamlemit.iter_events(widget)
+        else:
+            yield (yamlemit.mapping_start_event(widget),)
+            yield yamlemit.iter_mapping_body_events(widget)
+            yield (yamlemit.scalar_event("widgets"), yamlemit.SequenceStartEvent(None, None, True, flow_style=False))
+            open_widgets.append(idx)
+
+    for _ in open_widgets:
+        yield close_widget_events
+
+
+def _iter_list_event_chunks(items: typing.Sized, get_item) -> typing.Iterator[typing.Iterable["yaml.Event"]]:
+    yield (yamlemit.SequenceStartEvent(None, None, True, flow_style=len(items) == 0),)
+    for i in range(len(items)):
+        yield yamlemit.iter_events(get_item(i))
+    yield (yamlemit.SequenceEndEvent(),)
+
+
+def _iter_layout_event_chunks(data: bytes, index, compact: bool) -> typing.Iterator[typing.Iterable["yaml.Event"]]:
+    magic, version_major, version_minor, layout_id = struct.unpack_from("<4sHHH", data, 0)
+
+    def get_pane(idx: int):
+        pane = index.parse_pane(data, idx)
+        pane["name"] = index.panes_names[idx]
+        return pane
+
+    def get_anim(idx: int):
+        name = index.anims_names[idx]
+        anim = index.parse_anim(data, name)
+        fix_anim(anim, name, lambda widget_idx: f'{index.widgets_names[widget_idx]}-{widget_idx}', compact)
+        return anim
+
+    yield (yamlemit.StreamStartEvent(), yamlemit.DocumentStartEvent(explicit=False),
+           yamlemit.MappingStartEvent(None, None, True, flow_style=False))
+    for key, value in (("name", index.name), ("magic", magic), ("versionMajor", version_major),
+                       ("versionMinor", version_minor), ("layoutId", layout_id)):
+        yield (yamlemit.scalar_event(key), yamlemit.scalar_event(value))
+    yield (yamlemit.scalar_event("panes"),)
+    yield from _iter_list_event_chunks(index.panes_names, get_pane)
+    yield (yamlemit.scalar_event("anims"),)
+    yield from _iter_list_event_chunks(index.anims_names, get_anim)
+    yield (yamlemit.scalar_event("mainWidgetsNames"),)
+    yield yamlemit.iter_events(index.main_widgets_names)
+    yield (yamlemit.scalar_event("playersNames"),)
+    yield yamlemit.iter_events(index.players_names)
+    yield (yamlemit.scalar_event("rootWidget"),)
+    yield from _iter_widget_tree_event_chunks(data, index)
+    yield (yamlemit.MappingEndEvent(), yamlemit.DocumentEndEvent(explicit=False), yamlemit.StreamEndEvent())
+
+
+def iter_layout_events(data: bytes, compact: bool = False) -> typing.Iterator["yaml.Event"]:
+    """Emits the same YAML as dump_layout, decoding the layout one widget, pane or anim at a time."""
+    with phase("index"):
+        index = layoutindex.get_layout_index(data)
+    if not index.widgets_names:
+        raise ValueError("Layout has no widgets")
+    return itertools.chain.from_iterable(_iter_layout_event_chunks(data, index, compact))
+
+
+def dump_layout_streaming(data: bytes, stream: typing.Optional[typing.TextIO] = None,
+                          compact: bool = False) -> None:
+    events = iter_layout_events(data, compact)
+    # Widgets, panes and anims are parsed as they are emitted, so this includes parsing.
+    with phase("emit"):
+        yamlemit.emit(events, stream or sys.stdout)
+
+
+def dump_anim(data: bytes, name: str, compact: bool = False,
+              stream: typing.Optional[typing.TextIO] = None) -> None:
+    with phase("index"):
+        index = layoutindex.get_layout_index(data)
+    with phase("parse"):
+        anim = index.parse_anim(data, name)
+        fix_anim(anim, name, lambda idx: f'{index.widgets_names[idx]}-{idx}', compact)
+    dump(anim, stream)
+
+
+def dump_project(project, stream: typing.Optional[typing.TextIO] = None) -> None:
     project.packages = [{"id": i, "name": x} for i, x in enumerate(project.packages)]
     project.layouts = [{"id": i, "name": x} for i, x in enumerate(project.layouts)]
-    dump(project)
+    dump(project, stream)
+
+
+def dump_source(data: bytes, type: str, stream: typing.Optional[typing.TextIO] = None,
+                compact: bool = False, anim: str = "") -> None:
+    """Converts a binary file to YAML. anim can be set to only dump one anim of a layout."""
+    if type == "mfl" and anim:
+        dump_anim(data, anim, compact, stream)
+    elif type == "mfl":
+        dump_layout_streaming(data, stream, compact)
+    elif type == "mfpk":
+        with phase("parse"):
+            package = schemas.Package.parse(data)
+        dump(package, stream)
+    elif type == "mfpj":
+        with phase("parse"):
+            project = schemas.Project.parse(data)
+        dump_project(project, stream)
+    else:
+        raise ValueError("unknown type: " + type)
+
+
+def _describe(path: Path, member: str) -> str:
+    return f"{path}:{member}" if member else str(path)
+
+
+def _run_batch(jobs: typing.Sequence[ConversionJob], args) -> int:
+    num_errors = 0
+    for result in run_conversion_jobs(jobs, args.cache_dir, args.compact, args.jobs):
+        job = result.job
+        if result.error:
+            num_errors += 1
+            sys.stderr.write(f"error: {_describe(job.src, job.src_member)}: {result.error}\n")
+        else:
+            print(_describe(job.dest, job.dest_member), flush=True)
+    if num_errors:
+        sys.stderr.write(f"{num_errors} of {len(jobs)} conversions failed\n")
+    return num_errors
+
+
+def _get_watch_root(spec: str) -> Path:
+    archive_path, _ = split_archive_spec(spec)
+    if archive_path:
+        return archive_path
+    path = Path(spec)
+    while any(c in path.name for c in "*?[") or path.name == "**":
+        path = path.parent
+    return path
+
+
+def _watch(args, to_binary: typing.Optional[bool]) -> None:
+    watcher = watch.PollingWatcher([_get_watch_root(spec) for spec in args.file],
+                                   ignore=lambda path: path.name.endswith(".tmp"))
+    sys.stderr.write("watching for changes...\n")
+    try:
+        for changed in watcher.iter_changes():
+            try:
+                jobs = collect_conversion_jobs(args.file, args.output, to_binary, args.into)
+            except (ValueError, OSError) as e:
+                sys.stderr.write(f"error: {e}\n")
+                continue
+            jobs = [job for job in jobs if job.src in changed]
+            if jobs:
+                _run_batch(jobs, args)
+    except KeyboardInterrupt:
+        pass
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--type", help="File type (automatically detected using file extension), e.g. mfl, mfpk", default="")
-    parser.add_argument("file", type=Path)
+    parser.add_argument(
+        "--anim", help="Only dump the anim with the specified name (layouts only)", default="")
+    parser.add_argument(
+        "--compact", action="store_true", help="Store anim keyframes as parallel lists in YAML output")
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Reuse binaries built from identical YAML (stored in this directory)")
+    parser.add_argument(
+        "-o", "--output", type=Path,
+        help="Output directory for batch conversions (default: next to the input files)")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Number of worker processes for batch conversions")
+    parser.add_argument(
+        "--to", choices=["binary", "text"], help="Only do conversions in one direction (batch mode)")
+    parser.add_argument(
+        "--into", help="Store built binaries in an archive (archive.gar, archive.gar:dir/ or archive.gar:name)")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep running and rebuild YAML files (and the --into archive) whenever they change")
+    parser.add_argument(
+        "--profile", metavar="FILE", help="Write a cProfile profile (pstats format) to this file")
+    parser.add_argument(
+        "--timings", action="store_true",
+        help="Print the wall time, CPU time and peak memory of every phase (tracing memory slows things down)")
+    parser.add_argument(
+        "file", nargs="+",
+        help="File to convert (may be archive.gar:path/inside). Batch mode is used for several files, "
+             "directories, glob patterns, archives, or with -o/--into")
 
     args = parser.parse_args()
+    if args.profile or args.timings:
+        # Work done in worker processes would not be measured.
+        args.jobs = 1
+    run_instrumented(lambda: _convert(parser, args), args.profile, args.timings)
+
+
+def _convert(parser: argparse.ArgumentParser, args) -> None:
     type = args.type
-    path = args.file
 
+    spec = args.file[0]
+    archive_path, member = split_archive_spec(spec)
+    if (len(args.file) > 1 or args.output or args.into or args.watch or Path(spec).is_dir()
+            or (archive_path and not member) or any(c in spec for c in "*?[")):
+        # Watch mode only rebuilds binaries, as dumping them again would trigger more rebuilds.
+        to_binary = True if args.watch else {"binary": True, "text": False}.get(args.to)
+        try:
+            jobs = collect_conversion_jobs(args.file, args.output, to_binary, args.into)
+        except ValueError as e:
+            parser.error(str(e))
+        num_errors = _run_batch(jobs, args)
+        if args.watch:
+            _watch(args, to_binary)
+        if num_errors:
+            sys.exit(1)
+        return
+
+    with phase("read"):
+        if archive_path:
+            path = Path(member)
+            data = read_source(archive_path, member)
+        else:
+            path = Path(spec)
+            data = path.read_bytes()
+    cache = BuildCache(args.cache_dir) if args.cache_dir else None
     if not type:
-        type = path.suffixes[0][1:]
+        type = get_file_type(path)
 
     if path.suffix == ".yml":
         # convert to binary
-        data = yaml.load(path.read_text(), Loader=yaml.CSafeLoader)
-        if type == "mfl":
-            sys.stdout.buffer.write(build_layout(data))
-        elif type == "mfpk":
-            sys.stdout.buffer.write(Package.build(data))
-        elif type == "mfpj":
-            sys.stdout.buffer.write(build_project(data))
-        else:
-            raise ValueError("unknown type: " + type)
+        built = build_source(bytes(data), type, cache)
+        with phase("write"):
+            sys.stdout.buffer.write(built)
     else:
         # convert to text
-        data = path.read_bytes()
-        if type == "mfl":
-            dump_layout(Layout.parse(data))
-        elif type == "mfpk":
-            dump(Package.parse(data))
-        elif type == "mfpj":
-            dump_project(Project.parse(data))
-        else:
-            raise ValueError("unknown type: " + type)
+        dump_source(data, type, compact=args.compact, anim=args.anim)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,309 @@
+"""Long-running conversion server and its client.
+
+The server keeps the schemas loaded and answers requests on a Unix socket, so that editor
+integrations do not pay the import cost of construct and yaml for every conversion.
+
+Requests and responses are JSON objects, one per line:
+    {"id": 1, "method": "parse", "params": {"path": "/abs/path/file.mfl"}}
+    {"id": 1, "result": {"text": "..."}}  or  {"id": 1, "error": {"message": "..."}}
+
+Paths are resolved by the server, so clients should send absolute paths.
+This module must stay cheap to import: the client never needs the format modules.
+"""
+import argparse
+import base64
+import json
+import os
+from pathlib import Path
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import typing
+
+
+def _get_private_dir() -> Path:
+    """Returns a directory in the temp dir that only the current user can access."""
+    path = Path(tempfile.gettempdir()) / f"jktool-{os.getuid()}"
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    # Another user could have created it first (or made it a symlink).
+    st = path.lstat()
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise ValueError(f"{path} is not a private directory owned by the current user")
+    return path
+
+
+def get_default_socket_path() -> Path:
+    """Returns the socket path: $JKTOOL_SOCKET, else in $XDG_RUNTIME_DIR or a private temp directory."""
+    path = os.environ.get("JKTOOL_SOCKET")
+    if path:
+        return Path(path)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and Path(runtime_dir).is_dir():
+        return Path(runtime_dir) / "jktool.sock"
+    return _get_private_dir() / "jktool.sock"
+
+
+def _split_spec(path: str) -> typing.Tuple[Path, str]:
+    from jktool.lyttool import split_archive_spec
+    archive_path, member = split_archive_spec(path)
+    return (archive_path, member) if archive_path and member else (Path(path), "")
+
+
+def _parse(path: str, type: str = "", compact: bool = False, anim: str = "",
+           output: typing.Optional[str] = None) -> dict:
+    import io
+    from jktool import lyttool
+    src, member = _split_spec(path)
+    data = lyttool.read_source(src, member)
+    type = type or lyttool.get_file_type(Path(member or src))
+    if output is None:
+        stream = io.StringIO()
+        lyttool.dump_source(data, type, stream, compact, anim)
+        return {"text": stream.getvalue()}
+    with open(output, "w") as stream:
+        lyttool.dump_source(data, type, stream, compact, anim)
+    return {"output": output}
+
+
+def _build(path: str, type: str = "", output: typing.Optional[str] = None,
+           cache_dir: typing.Optional[str] = None) -> dict:
+    from jktool import lyttool
+    from jktool.buildcache import BuildCache
+    src, member = _split_spec(path)
+    source = bytes(lyttool.read_source(src, member))
+    type = type or lyttool.get_file_type(Path(member or src))
+    built = lyttool.build_source(source, type, BuildCache(Path(cache_dir)) if cache_dir else None)
+    if output is None:
+        return {"data": base64.b64encode(built).decode("ascii")}
+    Path(output).write_bytes(built)
+    return {"output": output}
+
+
+def _list(archive: str) -> dict:
+    from jktool.lyttool import open_archive
+    files = open_archive(Path(archive)).get_files()
+    return {"files": [{"name": name, "offset": file.offset, "size": len(file.data)}
+                      for name, file in files.items()]}
+
+
+def _extract(archive: str) -> dict:
+    from jktool.gartool import extract_archive
+    return {"files": [str(path) for path in extract_archive(Path(archive))]}
+
+
+def _pack(dir: str, dest: str, alignment: typing.Optional[int] = None) -> dict:
+    from jktool.gartool import make_writer, write_archive
+    directory = Path(dir)
+    if not directory.is_dir():
+        raise ValueError(f"{directory} is not a directory")
+    write_archive(make_writer(directory, alignment), Path(dest))
+    return {"output": dest}
+
+
+_METHODS: typing.Dict[str, typing.Callable[..., dict]] = {
+    "parse": _parse,
+    "build": _build,
+    "list": _list,
+    "extract": _extract,
+    "pack": _pack,
+}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.handle_request_line(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Conversion server. Connections are handled concurrently, requests one at a time."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path) -> None:
+        self.socket_path = socket_path
+        if socket_path.exists():
+            if _is_server_running(socket_path):
+                raise ValueError(f"a server is already listening on {socket_path}")
+            socket_path.unlink()
+        super().__init__(str(socket_path), _RequestHandler)
+        # Requests can read and write any file the server can: only the owner may connect.
+        os.chmod(socket_path, 0o600)
+        self._lock = threading.Lock()
+
+    def handle_request_line(self, line: bytes) -> dict:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = request["method"]
+            if method == "shutdown":
+                threading.Thread(target=self.shutdown).start()
+                return {"id": request_id, "result": {}}
+            fn = _METHODS.get(method)
+            if fn is None:
+                raise ValueError(f"unknown method: {method}")
+            with self._lock:
+                result = fn(**request.get("params", dict()))
+            return {"id": request_id, "result": result}
+        except Exception as e:
+            return {"id": request_id, "error": {"message": f"{e.__class__.__name__}: {e}"}}
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def serve(socket_path: typing.Optional[Path] = None) -> None:
+    """Runs a server until it receives a shutdown request or is interrupted."""
+    # Load everything up front so that the first request is as fast as the others.
+    import jktool.gartool
+    import jktool.lyttool
+    jktool.lyttool.preload()
+    server = Server(socket_path or get_default_socket_path())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class Client:
+    """Sends requests to a running server over a single connection."""
+
+    def __init__(self, socket_path: typing.Optional[Path] = None) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(str(socket_path or get_default_socket_path()))
+        self._file = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def call(self, method: str, **params) -> dict:
+        """Calls a method on the server. Errors are raised as RuntimeError."""
+        self._next_id += 1
+        request = {"id": self._next_id, "method": method, "params": params}
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"]["message"])
+        return response["result"]
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _is_server_running(socket_path: Path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+
+
+def _abspath(path: typing.Optional[str]) -> typing.Optional[str]:
+    return os.path.abspath(path) if path else path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Conversion server that keeps the tools loaded, and its client.')
+    parser.add_argument('--socket', type=Path, help='Socket path (default: $JKTOOL_SOCKET or a per-user path in the temp directory)')
+
+    subparsers = parser.add_subparsers(dest='command', help='Command')
+    subparsers.required = True
+
+    subparsers.add_parser('serve', description='Run the server')
+    subparsers.add_parser('stop', description='Stop the server')
+
+    p_parser = subparsers.add_parser('parse', description='Convert a binary file to YAML')
+    p_parser.add_argument('--type', default='', help='File type (automatically detected using file extension)')
+    p_parser.add_argument('--anim', default='', help='Only dump the anim with the specified name (layouts only)')
+    p_parser.add_argument('--compact', action='store_true', help='Store anim keyframes as parallel lists')
+    p_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    p_parser.add_argument('file', help='File to convert (may be archive.gar:path/inside)')
+
+    b_parser = subparsers.add_parser('build', description='Convert a YAML file to binary')
+    b_parser.add_argument('--type', default='', help='File type (automatically detected using file extension)')
+    b_parser.add_argument('--cache-dir', help='Reuse binaries built from identical YAML')
+    b_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    b_parser.add_argument('file', help='File to convert')
+
+    l_parser = subparsers.add_parser('list', description='List files in an archive')
+    l_parser.add_argument('gar', help='Path to a GAR archive')
+
+    x_parser = subparsers.add_parser('extract', description='Extract an archive')
+    x_parser.add_argument('gar', help='Path to a GAR archive')
+
+    c_parser = subparsers.add_parser('pack', description='Create an archive')
+    c_parser.add_argument('-n', '--default-alignment', type=lambda n: int(n, 0),
+                          help='Set the default alignment for files. Defaults to 4.')
+    c_parser.add_argument('dir', help='Directory to pack')
+    c_parser.add_argument('dest', help='Destination archive')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            serve(args.socket)
+        except ValueError as e:
+            sys.stderr.write(f'error: {e}\n')
+            sys.exit(1)
+        return
+
+    try:
+        with Client(args.socket) as client:
+            if args.command == 'stop':
+                client.call('shutdown')
+            elif args.command == 'parse':
+                result = client.call('parse', path=_abspath(args.file), type=args.type, compact=args.compact,
+                                     anim=args.anim, output=_abspath(args.output))
+                if 'text' in result:
+                    sys.stdout.write(result['text'])
+            elif args.command == 'build':
+                result = client.call('build', path=_abspath(args.file), type=args.type,
+                                     output=_abspath(args.output), cache_dir=_abspath(args.cache_dir))
+                if 'data' in result:
+                    sys.stdout.buffer.write(base64.b64decode(result['data']))
+            elif args.command == 'list':
+                for file in client.call('list', archive=_abspath(args.gar))['files']:
+                    print('%s [0x%x bytes] @ 0x%x' % (file['name'], file['size'], file['offset']))
+            elif args.command == 'extract':
+                for path in client.call('extract', archive=_abspath(args.gar))['files']:
+                    print(path)
+            elif args.command == 'pack':
+                client.call('pack', dir=_abspath(args.dir), dest=_abspath(args.dest),
+                            alignment=args.default_alignment)
+    except (ConnectionError, FileNotFoundError) as e:
+        sys.stderr.write(f'error: cannot connect to the server ({e}). Start it with "jktool-server serve".\n')
+        sys.exit(1)
+    except (RuntimeError, ValueError) as e:
+        sys.stderr.write(f'error: {e}\n')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
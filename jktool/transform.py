@@ -0,0 +1,128 @@
+from array import array
+import math
+import typing
+
+from jktool.animeval import BakedAnim
+from jktool.layout import WidgetValueType
+from jktool.widgettree import WidgetTree
+
+# 3x4 row-major affine matrix: the rotation/scale part in columns 0-2, the translation in column 3.
+Matrix = typing.Tuple[float, ...]
+
+IDENTITY: Matrix = (
+    1.0, 0.0, 0.0, 0.0,
+    0.0, 1.0, 0.0, 0.0,
+    0.0, 0.0, 1.0, 0.0,
+)
+
+
+def compute_parents(widgets) -> array:
+    """Computes the parent index of every widget from the flat (pre-order) widget list.
+
+    Root widgets have -1 as their parent index.
+    """
+    return WidgetTree.from_widgets(widgets).parent
+
+
+def make_local_transform(translate, scale, rotate) -> Matrix:
+    """Returns T * Rz * Ry * Rx * S. Rotations are in degrees."""
+    rx, ry, rz = (math.radians(x) for x in rotate)
+    sin_x, cos_x = math.sin(rx), math.cos(rx)
+    sin_y, cos_y = math.sin(ry), math.cos(ry)
+    sin_z, cos_z = math.sin(rz), math.cos(rz)
+    scale_x, scale_y, scale_z = scale
+    return (
+        cos_y * cos_z * scale_x,
+        (sin_x * sin_y * cos_z - cos_x * sin_z) * scale_y,
+        (cos_x * sin_y * cos_z + sin_x * sin_z) * scale_z,
+        translate[0],
+        cos_y * sin_z * scale_x,
+        (sin_x * sin_y * sin_z + cos_x * cos_z) * scale_y,
+        (cos_x * sin_y * sin_z - sin_x * cos_z) * scale_z,
+        translate[1],
+        -sin_y * scale_x,
+        sin_x * cos_y * scale_y,
+        cos_x * cos_y * scale_z,
+        translate[2],
+    )
+
+
+def multiply(a: Matrix, b: Matrix) -> Matrix:
+    a00, a01, a02, a03, a10, a11, a12, a13, a20, a21, a22, a23 = a
+    b00, b01, b02, b03, b10, b11, b12, b13, b20, b21, b22, b23 = b
+    return (
+        a00 * b00 + a01 * b10 + a02 * b20,
+        a00 * b01 + a01 * b11 + a02 * b21,
+        a00 * b02 + a01 * b12 + a02 * b22,
+        a00 * b03 + a01 * b13 + a02 * b23 + a03,
+        a10 * b00 + a11 * b10 + a12 * b20,
+        a10 * b01 + a11 * b11 + a12 * b21,
+        a10 * b02 + a11 * b12 + a12 * b22,
+        a10 * b03 + a11 * b13 + a12 * b23 + a13,
+        a20 * b00 + a21 * b10 + a22 * b20,
+        a20 * b01 + a21 * b11 + a22 * b21,
+        a20 * b02 + a21 * b12 + a22 * b22,
+        a20 * b03 + a21 * b13 + a22 * b23 + a23,
+    )
+
+
+def _compose(local_transforms: typing.Sequence[Matrix], parents: typing.Sequence[int]) -> typing.List[Matrix]:
+    # Parents always come before their children in the widget list, so one pass is enough.
+    world: typing.List[Matrix] = []
+    for local, parent in zip(local_transforms, parents):
+        world.append(local if parent < 0 else multiply(world[parent], local))
+    return world
+
+
+def compute_world_transforms(widgets, parents: typing.Optional[typing.Sequence[int]] = None) -> typing.List[Matrix]:
+    """Computes the world transform of every widget in the flat widget list."""
+    if parents is None:
+        parents = compute_parents(widgets)
+    return _compose([make_local_transform(w.translate, w.scale, w.rotate) for w in widgets], parents)
+
+
+def _is_transform_value(value_type: WidgetValueType) -> bool:
+    return value_type <= WidgetValueType.RotateZ
+
+
+def compute_anim_world_transforms(widgets, anim: BakedAnim,
+                                  parents: typing.Optional[typing.Sequence[int]] = None,
+                                  ) -> typing.List[typing.List[Matrix]]:
+    """Computes the world transform of every widget for every frame of a baked anim.
+
+    Returns one list of transforms per sampled frame. Only widgets that have an animated
+    transform (or an animated ancestor) are recomputed; the others share the rest transform.
+    """
+    if parents is None:
+        parents = compute_parents(widgets)
+
+    rest_locals = [make_local_transform(w.translate, w.scale, w.rotate) for w in widgets]
+    rest_world = _compose(rest_locals, parents)
+
+    animated_locals: typing.Dict[int, typing.Dict[WidgetValueType, array]] = dict()
+    dirty: typing.List[int] = []
+    is_dirty = [False] * len(widgets)
+    for i, parent in enumerate(parents):
+        tracks = {vt: t for vt, t in anim.tracks.get(i, dict()).items() if _is_transform_value(vt)}
+        if tracks:
+            animated_locals[i] = tracks
+        if tracks or (parent >= 0 and is_dirty[parent]):
+            is_dirty[i] = True
+            dirty.append(i)
+
+    result: typing.List[typing.List[Matrix]] = []
+    for frame_idx in range(len(anim.frames)):
+        world = list(rest_world)
+        for i in dirty:
+            local = rest_locals[i]
+            tracks = animated_locals.get(i)
+            if tracks:
+                widget = widgets[i]
+                values = [*widget.translate, *widget.scale, *widget.rotate]
+                for value_type, track in tracks.items():
+                    values[value_type] = track[frame_idx]
+                local = make_local_transform(values[0:3], values[3:6], values[6:9])
+            parent = parents[i]
+            world[i] = local if parent < 0 else multiply(world[parent], local)
+        result.append(world)
+    return result
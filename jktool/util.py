@@ -0,0 +1,26 @@
+import hashlib
+import importlib.util
+import sys
+import types
+import typing
+
+
+def content_hash(data: typing.Union[bytes, memoryview]) -> str:
+    """Returns a stable hex digest of data, used as a cache key for file contents."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Returns a module that is only actually imported when one of its attributes is first used."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,61 @@
+from pathlib import Path
+import time
+import typing
+
+_Snapshot = typing.Dict[Path, typing.Tuple[int, int]]
+
+
+class PollingWatcher:
+    """Watches files and directory trees for changes by periodically comparing mtimes and sizes.
+
+    This only relies on os.stat, so it works on every platform and filesystem.
+    """
+
+    def __init__(self, paths: typing.Iterable[Path], interval: float = 0.5,
+                 ignore: typing.Callable[[Path], bool] = lambda path: False) -> None:
+        self.paths = list(paths)
+        self.interval = interval
+        self.ignore = ignore
+        self._snapshot = self._scan()
+
+    def _scan(self) -> _Snapshot:
+        snapshot: _Snapshot = dict()
+        for root in self.paths:
+            candidates = root.rglob("*") if root.is_dir() else (root,)
+            for path in candidates:
+                if self.ignore(path):
+                    continue
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.is_file():
+                    snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self) -> typing.Set[Path]:
+        """Returns the files that were added, modified or removed since the last call."""
+        snapshot = self._scan()
+        changed = {path for path, stamp in snapshot.items() if self._snapshot.get(path) != stamp}
+        changed.update(path for path in self._snapshot if path not in snapshot)
+        self._snapshot = snapshot
+        return changed
+
+    def iter_changes(self) -> typing.Iterator[typing.Set[Path]]:
+        """Yields sets of changed files forever.
+
+        Changes are only reported once files have stopped changing for one interval, so that
+        editors that save in several steps trigger a single rebuild.
+        """
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if not changed:
+                continue
+            while True:
+                time.sleep(self.interval)
+                more = self.poll()
+                if not more:
+                    break
+                changed |= more
+            yield changed
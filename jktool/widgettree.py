@@ -0,0 +1,90 @@
+from array import array
+import typing
+
+from jktool.layout import WidgetType
+
+
+def get_num_children(widget) -> int:
+    if widget["type"] == WidgetType.Layout:
+        return widget["numChildWidgets"]
+    if widget["type"] == WidgetType.Group:
+        return widget["objectIdx"]
+    return 0
+
+
+class WidgetTree:
+    """Explicit tree index over a flat (pre-order) widget list.
+
+    Every array is indexed by widget index and uses -1 for "none". Because widgets are stored
+    in pre-order, the descendants of a widget are always the contiguous range that ends at
+    subtree_end, so subtree queries do not require walking the tree again.
+    """
+
+    def __init__(self, child_counts: typing.Sequence[int]) -> None:
+        n = len(child_counts)
+        self.parent = array('i', [-1]) * n
+        self.first_child = array('i', [-1]) * n
+        self.next_sibling = array('i', [-1]) * n
+        self.subtree_end = array('i', range(1, n + 1))
+        self.roots: typing.List[int] = []
+
+        # [widget index, number of children that have yet to be visited, last visited child]
+        stack: typing.List[typing.List[int]] = []
+        for i, num_children in enumerate(child_counts):
+            if stack:
+                top = stack[-1]
+                self.parent[i] = top[0]
+                if top[2] < 0:
+                    self.first_child[top[0]] = i
+                else:
+                    self.next_sibling[top[2]] = i
+                top[1] -= 1
+                top[2] = i
+            else:
+                if self.roots:
+                    self.next_sibling[self.roots[-1]] = i
+                self.roots.append(i)
+
+            if num_children:
+                stack.append([i, num_children, -1])
+            else:
+                while stack and stack[-1][1] == 0:
+                    self.subtree_end[stack.pop()[0]] = i + 1
+
+        # Truncated widget lists: whatever is still open extends to the end of the list.
+        for idx, _, _ in stack:
+            self.subtree_end[idx] = n
+
+    @classmethod
+    def from_widgets(cls, widgets) -> 'WidgetTree':
+        return cls([get_num_children(w) for w in widgets])
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def children(self, idx: int) -> typing.Iterator[int]:
+        child = self.first_child[idx]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def descendants(self, idx: int) -> range:
+        """Returns the indices of all descendants of a widget, in pre-order."""
+        return range(idx + 1, self.subtree_end[idx])
+
+    def ancestors(self, idx: int) -> typing.Iterator[int]:
+        parent = self.parent[idx]
+        while parent >= 0:
+            yield parent
+            parent = self.parent[parent]
+
+
+def linearize(root: dict) -> typing.List[dict]:
+    """Flattens a nested widget tree (using the "widgets" key) into a pre-order list."""
+    widgets: typing.List[dict] = []
+    stack = [root]
+    while stack:
+        widget = stack.pop()
+        widgets.append(widget)
+        stack.extend(reversed(widget["widgets"]))
+    return widgets
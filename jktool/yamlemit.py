@@ -0,0 +1,195 @@
+import base64
+import enum
+import struct
+import typing
+
+import construct as ct
+import yaml
+from yaml.events import (DocumentEndEvent, DocumentStartEvent, MappingEndEvent, MappingStartEvent,
+                         ScalarEvent, SequenceEndEvent, SequenceStartEvent, StreamEndEvent,
+                         StreamStartEvent)
+from yaml.nodes import ScalarNode
+
+_STR_TAG = 'tag:yaml.org,2002:str'
+_INT_TAG = 'tag:yaml.org,2002:int'
+_FLOAT_TAG = 'tag:yaml.org,2002:float'
+_BOOL_TAG = 'tag:yaml.org,2002:bool'
+_NULL_TAG = 'tag:yaml.org,2002:null'
+_BINARY_TAG = 'tag:yaml.org,2002:binary'
+_MAP_TAG = 'tag:yaml.org,2002:map'
+_SEQ_TAG = 'tag:yaml.org,2002:seq'
+
+# Keys that are emitted first (in this order) so that dumps are easier to read.
+_FIRST_KEYS = ("name", "id", "widget")
+
+_resolver = yaml.resolver.Resolver()
+_str_implicit_cache: typing.Dict[str, typing.Tuple[bool, bool]] = dict()
+
+
+def _float_event(value: float) -> ScalarEvent:
+    # Same representation as yaml.SafeRepresenter.represent_float.
+    if value != value:
+        text = '.nan'
+    elif value == float('inf'):
+        text = '.inf'
+    elif value == -float('inf'):
+        text = '-.inf'
+    else:
+        text = repr(value).lower()
+        if '.' not in text and 'e' in text:
+            text = text.replace('e', '.0e', 1)
+    return ScalarEvent(None, _FLOAT_TAG, (True, False), text)
+
+
+_f32 = struct.Struct('<f')
+
+
+def _f32_float_event(value: float) -> ScalarEvent:
+    # Shortest representation that still converts back to the same 32-bit float.
+    if value != value or value in (float('inf'), -float('inf')):
+        return _float_event(value)
+    try:
+        packed = _f32.pack(value)
+    except OverflowError:
+        return _float_event(value)
+    for fmt in ('%.6g', '%.7g', '%.8g', '%.9g'):
+        text = fmt % value
+        if _f32.pack(float(text)) == packed:
+            break
+    mantissa, e, exponent = text.partition('e')
+    if '.' not in mantissa:
+        mantissa += '.0'
+    return ScalarEvent(None, _FLOAT_TAG, (True, False), mantissa + e + exponent)
+
+
+class Float32List(list):
+    """List of scalars that is emitted in flow style, with floats written as 32-bit floats.
+
+    This produces much shorter output for values that came from (and go back to) f32 fields.
+    """
+
+
+def _iter_float32_list_events(l: Float32List) -> typing.Iterator[yaml.Event]:
+    yield SequenceStartEvent(None, _SEQ_TAG, True, flow_style=True)
+    for value in l:
+        yield _f32_float_event(value) if type(value) is float else scalar_event(value)
+    yield SequenceEndEvent()
+
+
+def _int_event(value: int) -> ScalarEvent:
+    return ScalarEvent(None, _INT_TAG, (True, False), str(int(value)))
+
+
+def _str_event(value: str) -> ScalarEvent:
+    implicit = _str_implicit_cache.get(value)
+    if implicit is None:
+        implicit = (_resolver.resolve(ScalarNode, value, (True, False)) == _STR_TAG, True)
+        if len(_str_implicit_cache) < 0x10000:
+            _str_implicit_cache[value] = implicit
+    return ScalarEvent(None, _STR_TAG, implicit, value)
+
+
+def _bool_event(value: bool) -> ScalarEvent:
+    return ScalarEvent(None, _BOOL_TAG, (True, False), 'true' if value else 'false')
+
+
+def _null_event(value: None) -> ScalarEvent:
+    return ScalarEvent(None, _NULL_TAG, (True, False), 'null')
+
+
+def _bytes_event(value: bytes) -> ScalarEvent:
+    return ScalarEvent(None, _BINARY_TAG, (False, False), base64.encodebytes(value).decode('ascii'), style='|')
+
+
+_SCALAR_EVENT_MAKERS: typing.Dict[type, typing.Callable[[typing.Any], ScalarEvent]] = {
+    float: _float_event,
+    int: _int_event,
+    str: _str_event,
+    bool: _bool_event,
+    type(None): _null_event,
+    bytes: _bytes_event,
+}
+
+
+def scalar_event(value) -> ScalarEvent:
+    maker = _SCALAR_EVENT_MAKERS.get(type(value))
+    if maker is not None:
+        return maker(value)
+    # Enums are emitted as plain integers.
+    if isinstance(value, (ct.EnumIntegerString, enum.IntEnum)):
+        return _int_event(int(value))
+    for base, maker in _SCALAR_EVENT_MAKERS.items():
+        if isinstance(value, base):
+            return maker(value)
+    raise TypeError(f"cannot emit {type(value).__name__} as YAML")
+
+
+def _is_block(value) -> bool:
+    return isinstance(value, (dict, list, bytes))
+
+
+def _mapping_items(d: dict) -> typing.Iterator:
+    for key in _FIRST_KEYS:
+        if key in d:
+            yield key
+            yield d[key]
+    for key, value in d.items():
+        if not key.startswith("_") and key not in _FIRST_KEYS:
+            yield key
+            yield value
+
+
+def mapping_start_event(d: dict) -> MappingStartEvent:
+    # Like yaml.dump with default_flow_style=None: flow style if every value is a scalar.
+    flow = not any(_is_block(v) for k, v in d.items() if not k.startswith("_"))
+    return MappingStartEvent(None, _MAP_TAG, True, flow_style=flow)
+
+
+def sequence_start_event(l: list) -> SequenceStartEvent:
+    return SequenceStartEvent(None, _SEQ_TAG, True, flow_style=not any(_is_block(v) for v in l))
+
+
+def iter_events(value) -> typing.Iterator[yaml.Event]:
+    """Emits YAML events for parsed data, without building an intermediate copy of it.
+
+    Keys starting with an underscore (e.g. construct's _io) are skipped and enums become
+    integers. This walks the data with an explicit stack, so deep widget trees are fine.
+    """
+    stack: typing.List[typing.Tuple[typing.Iterator, typing.Any]] = [(iter((value,)), None)]
+    while stack:
+        items, end_event = stack[-1]
+        for item in items:
+            if isinstance(item, dict):
+                yield mapping_start_event(item)
+                stack.append((_mapping_items(item), MappingEndEvent))
+                break
+            if type(item) is Float32List:
+                yield from _iter_float32_list_events(item)
+                continue
+            if isinstance(item, list):
+                yield sequence_start_event(item)
+                stack.append((iter(item), SequenceEndEvent))
+                break
+            yield scalar_event(item)
+        else:
+            stack.pop()
+            if end_event is not None:
+                yield end_event()
+
+
+def iter_mapping_body_events(d: dict) -> typing.Iterator[yaml.Event]:
+    """Emits the events for the keys and values of a mapping, without its start and end events."""
+    for item in _mapping_items(d):
+        yield from iter_events(item)
+
+
+def iter_document_events(value) -> typing.Iterator[yaml.Event]:
+    yield StreamStartEvent()
+    yield DocumentStartEvent(explicit=False)
+    yield from iter_events(value)
+    yield DocumentEndEvent(explicit=False)
+    yield StreamEndEvent()
+
+
+def emit(events: typing.Iterable[yaml.Event], stream: typing.TextIO) -> None:
+    yaml.emit(events, stream=stream, Dumper=yaml.CSafeDumper)
@@ -27,6 +27,9 @@ setuptools.setup(
         'console_scripts': [
             'gar = jktool.gartool:main',
             'glyttool = jktool.lyttool:main',
+            'glytdiff = jktool.layoutdiff:main',
+            'glytquery = jktool.layoutquery:main',
+            'jktool-server = jktool.server:main',
         ],
     },
 )
@@ -0,0 +1,31 @@
+"""Small synthetic layouts and archives, generated with benchmarks/corpus.py."""
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import corpus  # noqa: E402
+
+SMALL_LAYOUT = corpus.LayoutParams(num_widgets=24, num_panes=12, num_anims=4, num_entries=6, num_keyframes=4)
+SMALL_ARCHIVE = corpus.ArchiveParams(num_files=24, sizes="small", alignment=0x80)
+
+
+def make_layout(**kwargs) -> dict:
+    """Returns a small layout (as built from YAML). Building it modifies it."""
+    return corpus.make_layout(SMALL_LAYOUT._replace(**kwargs))
+
+
+def make_archive_writer(**kwargs):
+    return corpus.make_archive_writer(SMALL_ARCHIVE._replace(**kwargs))
+
+
+@pytest.fixture(scope="session")
+def layout_data() -> bytes:
+    return corpus.make_layout_binary(SMALL_LAYOUT)
+
+
+@pytest.fixture(scope="session")
+def archive_data() -> bytes:
+    return corpus.make_archive(SMALL_ARCHIVE)
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from jktool import gar
+
+from conftest import make_archive_writer
+
+
+def _write(writer: gar.GarWriter) -> bytes:
+    stream = io.BytesIO()
+    writer.write(stream)
+    return stream.getvalue()
+
+
+def test_lookups(archive_data: bytes) -> None:
+    writer = make_archive_writer()
+    files = gar.Gar(archive_data).get_files()
+    assert list(files) == list(writer.files)
+    assert len(files) == len(writer.files)
+    for name, file in writer.files.items():
+        assert name in files
+        assert bytes(files[name].data) == file.data
+    assert "missing.bin" not in files
+    with pytest.raises(KeyError):
+        files["missing.bin"]
+    assert [bytes(file.data) for file in files.values()] == [file.data for file in writer.files.values()]
+
+
+def test_round_trip(archive_data: bytes) -> None:
+    assert _write(gar.GarWriter.from_gar(gar.Gar(archive_data))) == archive_data
+
+
+def test_duplicate_names_refer_to_last_entry() -> None:
+    plan = gar.GarWriterPlan([("a.bin", "bin"), ("b.bin", "bin"), ("a.bin", "bin")])
+    stream = io.BytesIO()
+    plan.write(stream, [b"first", b"b", b"last"], [4, 4, 4])
+    files = gar.Gar(stream.getvalue()).get_files()
+    assert list(files) == ["a.bin", "b.bin"]
+    assert bytes(files["a.bin"].data) == b"last"
+    assert [bytes(file.data) for file in files.values()] == [b"last", b"b"]
+
+
+def test_truncated_file_table(archive_data: bytes) -> None:
+    with pytest.raises(ValueError):
+        gar.Gar(archive_data[:0x20])
+
+
+def test_writer_plan_reuse() -> None:
+    writer = make_archive_writer()
+    _write(writer)
+    plan = writer._plan
+    # Same names and types: the plan is reused and the output matches a fresh writer.
+    for i, file in enumerate(writer.files.values()):
+        file.data = bytes([i]) * (len(file.data) + i)
+    assert _write(writer) == _write(gar.GarWriter.from_gar(gar.Gar(_write(writer))))
+    assert writer._plan is plan
+
+    fresh = make_archive_writer()
+    for file in fresh.files.values():
+        file.data = writer.files[file.name].data
+    assert _write(fresh) == _write(writer)
+
+    # Adding a file invalidates the plan.
+    writer.files["new.bin"] = gar.GarWriter.File("new.bin", b"new")
+    data = _write(writer)
+    assert writer._plan is not plan
+    assert bytes(gar.Gar(data).get_files()["new.bin"].data) == b"new"
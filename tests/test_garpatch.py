@@ -0,0 +1,101 @@
+import io
+import sys
+import typing
+
+import pytest
+
+from jktool import gar, garpatch, gartool
+
+from conftest import make_archive_writer
+
+
+def _write(writer: gar.GarWriter) -> bytes:
+    stream = io.BytesIO()
+    writer.write(stream)
+    return stream.getvalue()
+
+
+def _create(old: bytes, new: bytes) -> typing.Tuple[int, bytes]:
+    stream = io.BytesIO()
+    mode = garpatch.create_patch(old, new, stream)
+    return mode, stream.getvalue()
+
+
+def _apply(old: bytes, patch: bytes) -> bytes:
+    stream = io.BytesIO()
+    garpatch.apply_patch(old, patch, stream)
+    return stream.getvalue()
+
+
+@pytest.fixture(scope="module")
+def archives() -> typing.Tuple[bytes, bytes]:
+    """An archive and an updated version with a modified, a removed, a renamed and an added file."""
+    writer = make_archive_writer()
+    old = _write(writer)
+    names = list(writer.files)
+    modified = writer.files[names[0]]
+    modified.data = modified.data[:8] + b"modified" + modified.data[16:]
+    del writer.files[names[1]]
+    renamed = writer.files.pop(names[2])
+    writer.files["renamed.bin"] = gar.GarWriter.File("renamed.bin", renamed.data)
+    writer.files["added.bin"] = gar.GarWriter.File("added.bin", b"added" * 100)
+    return old, _write(writer)
+
+
+def test_entries_round_trip(archives) -> None:
+    old, new = archives
+    mode, patch = _create(old, new)
+    assert mode == garpatch.MODE_ENTRIES
+    assert len(patch) < len(new) // 4
+    assert _apply(old, patch) == new
+
+
+def test_raw_round_trip(archives) -> None:
+    old, new = archives
+    # Trailing data cannot be reproduced by GarWriter, and junk is not an archive at all.
+    for old_data, new_data in ((old, new + b"trailing"), (b"junk" * 100, new)):
+        mode, patch = _create(old_data, new_data)
+        assert mode == garpatch.MODE_RAW
+        assert _apply(old_data, patch) == new_data
+
+
+def test_delta_round_trip() -> None:
+    old = bytes(range(256)) * 64
+    new = old[:1000] + b"inserted" + old[1000:9000] + old[12000:]
+    stream = io.BytesIO()
+    garpatch.apply_delta(old, garpatch.make_delta(old, new), stream)
+    assert stream.getvalue() == new
+
+
+def test_wrong_archive(archives) -> None:
+    old, new = archives
+    _, patch = _create(old, new)
+    with pytest.raises(ValueError):
+        _apply(new, patch)
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_corrupt_patches_raise_value_error(archives, raw: bool) -> None:
+    old, new = archives
+    if raw:
+        new += b"trailing"
+    _, patch = _create(old, new)
+    corrupted = [patch[:size] for size in range(0, len(patch), max(1, len(patch) // 50))]
+    for pos in range(0, len(patch), max(1, len(patch) // 200)):
+        corrupted.append(patch[:pos] + bytes([patch[pos] ^ 0xFF]) + patch[pos + 1:])
+    for data in corrupted:
+        with pytest.raises(ValueError):
+            _apply(old, data)
+
+
+def test_cli_apply_removes_temp_file(archives, tmp_path, monkeypatch) -> None:
+    old, new = archives
+    _, patch = _create(old, new)
+    (tmp_path / "old.gar").write_bytes(old)
+    (tmp_path / "bad.patch").write_bytes(patch[:len(patch) // 2])
+    dest = tmp_path / "new.gar"
+    monkeypatch.setattr(sys, "argv", ["gar", "patch", "apply", str(tmp_path / "old.gar"),
+                                      str(tmp_path / "bad.patch"), str(dest)])
+    with pytest.raises(SystemExit):
+        gartool.main()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bad.patch", "old.gar"]
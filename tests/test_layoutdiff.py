@@ -0,0 +1,71 @@
+from jktool.layoutdiff import diff_layouts
+from jktool.lyttool import build_layout
+
+from conftest import make_layout
+
+
+def _paths(old: dict, new: dict) -> set:
+    return {(change.op, change.path) for change in diff_layouts(build_layout(old), build_layout(new))}
+
+
+def test_identical(layout_data: bytes) -> None:
+    assert diff_layouts(layout_data, bytes(layout_data)) == []
+
+
+def test_changes() -> None:
+    new = make_layout()
+    new["panes"][0]["data"]["width"] += 1
+    new["panes"].append({"name": "PNEW", "type": 0, "size": 0xC, "data": {"translate": [0.0, 0.0, 0.0]}})
+    new["rootWidget"]["widgets"][0]["translate"][0] = 5.0
+    new["playersNames"] = ["other"]
+    del new["anims"][-1]
+    new["anims"][0]["fps"] = 60
+    paths = _paths(make_layout(), new)
+    assert paths == {
+        ("changed", "panes/P0/data/width"),
+        ("added", "panes/PNEW"),
+        ("changed", "widgets/W1/translate/0"),
+        ("changed", "playersNames/0"),
+        ("removed", "anims/A3"),
+        ("changed", "anims/A0/fps"),
+    }
+
+
+def test_entry_change() -> None:
+    new = make_layout()
+    entry = new["anims"][1]["entries"][2]
+    if isinstance(entry["data"][0], dict):
+        entry["data"][0]["value"] = 42.0
+    else:
+        entry["data"][0] = 42.0
+    changes = diff_layouts(build_layout(make_layout()), build_layout(new))
+    assert len(changes) == 1
+    assert changes[0].path.startswith("anims/A1/entries/")
+    assert changes[0].new == 42.0
+
+
+def test_inserted_widget_only_changes_its_parent() -> None:
+    new = make_layout()
+    root = new["rootWidget"]
+    root["widgets"].insert(0, dict(root["widgets"][0], name="WNEW", id="WNEW-0", widgets=[]))
+    assert _paths(make_layout(), new) == {
+        ("added", "widgets/WNEW"),
+        ("changed", "widgets/W0/numChildWidgets"),
+    }
+
+
+def test_duplicate_anim_names() -> None:
+    old = make_layout()
+    old["anims"][1]["name"] = old["anims"][0]["name"]
+    new = make_layout()
+    new["anims"][1]["name"] = new["anims"][0]["name"]
+    new["anims"][1]["fps"] = 60
+    entry = new["anims"][1]["entries"][0]
+    if isinstance(entry["data"][0], dict):
+        entry["data"][0]["value"] = 42.0
+    else:
+        entry["data"][0] = 42.0
+    changes = diff_layouts(build_layout(old), build_layout(new))
+    assert {change.path.split("/")[1] for change in changes} == {"A0#1"}
+    assert ("anims/A0#1/fps", 30, 60) in {(change.path, change.old, change.new) for change in changes}
+    assert any(change.new == 42.0 for change in changes)
@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from jktool import gar
+from jktool.layout import PaneType
+from jktool.layoutquery import DEFAULT_INDEX_NAME, LayoutQuery
+from jktool.lyttool import build_layout
+
+from conftest import make_layout
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    """root/top.mfl, root/sub/ui.gar (with two layouts and a text file) and an invalid layout."""
+    root = tmp_path / "root"
+    (root / "sub").mkdir(parents=True)
+    (root / "top.mfl").write_bytes(build_layout(make_layout(seed=1)))
+    writer = gar.GarWriter()
+    for name, seed in (("layout/a.mfl", 2), ("layout/b.mfl", 3)):
+        writer.files[name] = gar.GarWriter.File(name, build_layout(make_layout(seed=seed)))
+    writer.files["readme.txt"] = gar.GarWriter.File("readme.txt", b"not a layout")
+    with (root / "sub/ui.gar").open("wb") as f:
+        writer.write(f)
+    (root / "bad.mfl").write_bytes(b"junk")
+    return root
+
+
+def test_refresh(tree: Path) -> None:
+    with LayoutQuery(tree / DEFAULT_INDEX_NAME) as index:
+        stats = index.refresh(1)
+        assert (stats.scanned, stats.unchanged, stats.removed) == (2, 0, 0)
+        assert [path for path, _ in stats.errors] == ["bad.mfl"]
+        assert [r.path for r in index.find_layouts()] == ["sub/ui.gar:layout/a.mfl", "sub/ui.gar:layout/b.mfl",
+                                                          "top.mfl"]
+
+        stats = index.refresh(1)
+        assert (stats.scanned, stats.unchanged, stats.removed) == (0, 2, 0)
+
+        (tree / "top.mfl").write_bytes(build_layout(make_layout(seed=4, num_panes=13)))
+        os.utime(tree / "top.mfl", ns=(1, 1))
+        (tree / "sub/ui.gar").unlink()
+        stats = index.refresh(1)
+        assert (stats.scanned, stats.unchanged, stats.removed) == (1, 0, 1)
+        assert [(r.path, r.num_panes) for r in index.find_layouts()] == [("top.mfl", 13)]
+
+
+def test_parallel_refresh_matches_serial(tree: Path, tmp_path: Path) -> None:
+    with LayoutQuery(tmp_path / "serial.sqlite", tree) as serial, \
+            LayoutQuery(tmp_path / "parallel.sqlite", tree) as parallel:
+        serial.refresh(1)
+        parallel.refresh(2)
+        assert serial.find_anim_entries() == parallel.find_anim_entries()
+        assert serial.find_widgets() == parallel.find_widgets()
+
+
+def test_queries(tree: Path) -> None:
+    layout = make_layout(seed=1)
+    with LayoutQuery(tree / DEFAULT_INDEX_NAME) as index:
+        index.refresh(1)
+
+        panes = [p for p in index.find_panes() if p.path == "top.mfl"]
+        assert [(p.name, p.type) for p in panes] == [(p["name"], PaneType(p["type"]).name) for p in layout["panes"]]
+        text_panes = [p for p in layout["panes"] if p["type"] == PaneType.Text]
+        assert text_panes
+        msg_id = text_panes[0]["data"]["msgId"]
+        assert ("top.mfl", text_panes[0]["name"]) in {(p.path, p.name) for p in index.find_panes(msg_id=msg_id)}
+        assert all(p.msg_id == msg_id and p.type == "Text" for p in index.find_panes(msg_id=msg_id))
+
+        assert {w.name for w in index.find_widgets("W1*")} == {w.name for w in index.find_widgets()
+                                                               if w.name.startswith("W1")}
+        assert all(w.type == "Pane" and w.pane for w in index.find_widgets(type="Pane"))
+
+        entries = [e for e in index.find_anim_entries() if e.path == "top.mfl"]
+        expected = [len(e["data"]) if e["type"] == 0 else 0 for anim in layout["anims"] for e in anim["entries"]]
+        assert [e.num_keyframes for e in entries] == expected
+        top = index.find_layouts("L", min_keyframes=sum(expected))
+        assert ("top.mfl", sum(expected)) in {(r.path, r.num_keyframes) for r in top}
+        assert all(r.num_keyframes >= sum(expected) for r in top)
+
+
+def test_index_outside_root(tree: Path, tmp_path: Path) -> None:
+    db_path = tmp_path / "elsewhere" / "index.sqlite"
+    db_path.parent.mkdir()
+    with LayoutQuery(db_path, tree) as index:
+        assert index.refresh(1).scanned == 2
+    # The indexed directory is remembered.
+    with LayoutQuery(db_path) as index:
+        assert index.root == tree.resolve()
+        assert index.refresh(1).unchanged == 2
+        assert len(index.find_layouts()) == 3
@@ -0,0 +1,62 @@
+import enum
+import io
+
+import construct as ct
+import yaml
+
+from jktool import lyttool, yamlemit
+from jktool.layout import Layout
+
+
+def _remove_io(v):
+    """How the data was prepared for yaml.dump before yamlemit existed."""
+    if isinstance(v, ct.core.EnumIntegerString) or isinstance(v, enum.IntEnum):
+        return int(v)
+    if isinstance(v, dict):
+        d = dict()
+        for key in ("name", "id", "widget"):
+            if key in v:
+                d[key] = v[key]
+        d.update({k: _remove_io(vv) for k, vv in v.items() if not k.startswith("_")})
+        return d
+    if isinstance(v, list):
+        return [_remove_io(x) for x in v]
+    return v
+
+
+def _yaml_dump(value) -> str:
+    return yaml.dump(_remove_io(value), Dumper=yaml.CSafeDumper, sort_keys=False, default_flow_style=None)
+
+
+def _emit(value) -> str:
+    stream = io.StringIO()
+    yamlemit.emit(yamlemit.iter_document_events(value), stream)
+    return stream.getvalue()
+
+
+def test_scalars_and_styles_match_yaml_dump() -> None:
+    value = {
+        "values": [0, -1, 1.5, 1e20, -2.5e-10, float("inf"), -float("inf"), float("nan"), True, None],
+        "strings": ["", "yes", "no", "1", "1.0", "~", "null", "a: b", "- x", "#", "é", "multi\nline", " x"],
+        "blob": b"\x00\x01binary",
+        "empty": {"list": [], "dict": {}},
+        "nested": [{"widget": "W", "id": "W-1", "x": [1, 2], "_io": None, "name": "N"}, [[1], [2, 3]]],
+        "enum": ct.core.EnumIntegerString.new(3, "Text"),
+    }
+    assert _emit(value) == _yaml_dump(value)
+
+
+def test_streamed_layout_matches_yaml_dump(layout_data: bytes, monkeypatch) -> None:
+    dumped = []
+    monkeypatch.setattr(lyttool, "dump", dumped.append)
+    lyttool.dump_layout(Layout.parse(layout_data))
+    stream = io.StringIO()
+    lyttool.dump_source(layout_data, "mfl", stream)
+    assert stream.getvalue() == _yaml_dump(dumped[0])
+
+
+def test_layout_round_trip(layout_data: bytes) -> None:
+    for compact in (False, True):
+        stream = io.StringIO()
+        lyttool.dump_source(layout_data, "mfl", stream, compact)
+        assert lyttool.build_layout(yaml.load(stream.getvalue(), Loader=yaml.CSafeLoader)) == layout_data